@@ -0,0 +1,108 @@
+"""Times how long each plugin in this package takes to import and to run
+its plugin_loaded(), for the print_startup_profile command.
+
+Sublime loads a package's plugins in name order, so the leading underscore
+gets this one loaded, and its import hook installed, before the others.
+Plugins reloaded later (e.g. when saved) are timed again.
+"""
+import sys
+import time
+
+import sublime_plugin
+
+
+PACKAGE_NAME = __name__.rpartition('.')[0]
+
+_IMPORT_TIME = time.perf_counter()
+_api_ready_time = None
+
+# module name -> {'import': seconds, 'plugin_loaded': seconds}
+_timings = {}
+
+
+def record(module_name, stage, seconds):
+    _timings.setdefault(module_name, {})[stage] = seconds
+
+
+def timed_plugin_loaded(module_name, plugin_loaded):
+    def wrapper():
+        start = time.perf_counter()
+        try:
+            return plugin_loaded()
+        finally:
+            record(module_name, 'plugin_loaded', time.perf_counter() - start)
+    return wrapper
+
+
+class TimingLoader:
+    def __init__(self, loader):
+        self.loader = loader
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        start = time.perf_counter()
+        try:
+            self.loader.exec_module(module)
+        finally:
+            record(module.__name__, 'import', time.perf_counter() - start)
+        plugin_loaded = module.__dict__.get('plugin_loaded')
+        if plugin_loaded:
+            module.plugin_loaded = timed_plugin_loaded(module.__name__, plugin_loaded)
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+class TimingFinder:
+    """Wraps the loader of every plugin module in this package in a
+    TimingLoader."""
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname.rpartition('.')[0] != PACKAGE_NAME:
+            return None
+        for finder in sys.meta_path:
+            if isinstance(finder, TimingFinder) or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is None:
+                continue
+            if hasattr(spec.loader, 'exec_module'):
+                spec.loader = TimingLoader(spec.loader)
+            return spec
+        return None
+
+
+_finder = TimingFinder()
+if PACKAGE_NAME:
+    sys.meta_path.insert(0, _finder)
+
+
+def plugin_loaded():
+    global _api_ready_time
+    _api_ready_time = time.perf_counter()
+
+
+def plugin_unloaded():
+    if _finder in sys.meta_path:
+        sys.meta_path.remove(_finder)
+
+
+class PrintStartupProfileCommand(sublime_plugin.ApplicationCommand):
+    def run(self):
+        rows = []
+        for module_name, stages in _timings.items():
+            import_time = stages.get('import', 0.0)
+            loaded_time = stages.get('plugin_loaded', 0.0)
+            rows.append((import_time + loaded_time, module_name, import_time, loaded_time))
+        rows.sort(reverse=True)
+
+        print(f'Startup profile for {PACKAGE_NAME} (ms):')
+        print(f'  {"module":<40} {"import":>9} {"loaded":>9} {"total":>9}')
+        for total, module_name, import_time, loaded_time in rows:
+            print(f'  {module_name:<40} {import_time * 1000:>9.2f} {loaded_time * 1000:>9.2f} {total * 1000:>9.2f}')
+        print(f'  {"all":<40} {sum(r[2] for r in rows) * 1000:>9.2f} {sum(r[3] for r in rows) * 1000:>9.2f} '
+              f'{sum(r[0] for r in rows) * 1000:>9.2f}')
+        if _api_ready_time is not None:
+            print(f'  API ready {(_api_ready_time - _IMPORT_TIME) * 1000:.0f} ms after this profiler was imported')
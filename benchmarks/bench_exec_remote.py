@@ -0,0 +1,211 @@
+"""Measures exec_remote throughput and latency against a local fake command
+port (see fake_command_port.py), so changes to the send path can be
+compared without a live Maya or Blender.
+
+Drives send_code_to_remote, print_selected_values and reload_current_module
+through the stub sublime module, for each protocol, at several payload
+sizes (closed loop, one request in flight at a time) and at several fixed
+request rates (open loop).  Latency is from the call until the remote has
+finished running the code.
+
+    python benchmarks/bench_exec_remote.py [--count 50] [--duration 2]
+        [--protocols file framed] [--length-prefixed] [--stages]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCHMARKS_DIR, 'stubs'), os.path.dirname(BENCHMARKS_DIR)]
+
+import sublime
+import exec_remote
+
+
+SIZES = (100, 10 * 1024, 1024 * 1024)
+RATES = (20, 100, 500)
+PRINT_EXPRS = (1, 10, 100)
+RELOAD_MODULES = (1, 10, 50)
+FILLER_LINE = 'node = "transform_%08d"  # padding to make the payload the requested size\n'
+APP = 'maya'
+
+
+def start_fake_port(length_prefixed, python_path):
+    args = [sys.executable, os.path.join(BENCHMARKS_DIR, 'fake_command_port.py')]
+    if length_prefixed:
+        args.append('--length-prefixed')
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [python_path, os.environ.get('PYTHONPATH')])))
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, env=env)
+    port = int(process.stdout.readline())
+    return process, port
+
+
+def configure(protocol, port, length_prefixed):
+    settings = sublime.load_settings(f'{exec_remote.THIS_MODULE_NAME}.sublime-settings')
+    settings.update({
+        f'{APP}_port': port,
+        f'{APP}_protocol': protocol,
+        f'{APP}_wire': 'length_prefixed' if length_prefixed else 'raw',
+        # As blender_frame_size, as a length prefixed port has no buffer limit.
+        f'{APP}_frame_size': 1024 * 1024 if length_prefixed else None,
+        f'{APP}_group': None,
+        'output_panel': False,
+        'target_timeout': 30,
+    })
+
+
+def make_code(size, salt):
+    # The salt keeps every request distinct, so none are deduplicated and
+    # none hit the agent's compiled code cache.
+    line_count = max(1, size // len(FILLER_LINE % 0))
+    return f'# request {salt}\n' + ''.join(FILLER_LINE % ii for ii in range(line_count))
+
+
+def make_package(root, num_modules):
+    package_dir = os.path.join(root, f'bench_package_{num_modules}')
+    os.makedirs(package_dir, exist_ok=True)
+    with open(os.path.join(package_dir, '__init__.py'), 'w') as fp:
+        fp.write('')
+    for ii in range(num_modules):
+        with open(os.path.join(package_dir, f'module_{ii}.py'), 'w') as fp:
+            if ii:
+                fp.write(f'from . import module_{ii - 1}\n')
+            fp.write(f'VALUE = {ii}\n')
+    return os.path.join(package_dir, f'module_{num_modules - 1}.py')
+
+
+class Recorder:
+    """A send_code_func that keeps the futures of the sends it makes."""
+
+    def __init__(self):
+        self.futures = []
+
+    def __call__(self, code_buffer):
+        futures = exec_remote.send_code_to_remote(APP, code_buffer, wait=True)
+        if futures is None:
+            raise RuntimeError('Request was not queued')
+        self.futures.extend(futures.values())
+
+    def pop(self):
+        futures, self.futures = self.futures, []
+        return futures
+
+
+def closed_loop(request, count):
+    latencies = []
+    start = time.perf_counter()
+    for ii in range(count):
+        request_start = time.perf_counter()
+        for future in request(ii):
+            future.result()
+        latencies.append(time.perf_counter() - request_start)
+    return time.perf_counter() - start, latencies
+
+
+def open_loop(request, rate, duration):
+    latencies = []
+    lock = threading.Lock()
+    futures = []
+
+    def on_done(request_start, future):
+        with lock:
+            latencies.append(time.perf_counter() - request_start)
+
+    count = max(1, int(rate * duration))
+    start = time.perf_counter()
+    for ii in range(count):
+        delay = start + ii / rate - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        request_start = time.perf_counter()
+        for future in request(ii):
+            future.add_done_callback(lambda future, request_start=request_start: on_done(request_start, future))
+            futures.append(future)
+    for future in futures:
+        future.exception()
+    return time.perf_counter() - start, latencies
+
+
+def report(name, protocol, param, elapsed, latencies):
+    latencies = sorted(latencies)
+    percentile = lambda fraction: exec_remote.percentile(latencies, fraction) * 1000
+    print(f'{name:<22} {protocol:<8} {param:>10} {len(latencies):>6} {len(latencies) / elapsed:>9.1f} '
+          f'{percentile(0.50):>9.2f} {percentile(0.95):>9.2f} {percentile(0.99):>9.2f}')
+
+
+def bench_protocol(protocol, port, length_prefixed, package_root, args):
+    configure(protocol, port, length_prefixed)
+    recorder = Recorder()
+
+    def send(size):
+        def request(ii):
+            recorder(exec_remote.CodeBuffer('python', make_code(size, ii)))
+            return recorder.pop()
+        return request
+
+    # Connect and install the agent before anything is timed.
+    closed_loop(send(SIZES[0]), 1)
+
+    for size in SIZES:
+        count = args.count if size < 1024 * 1024 else max(1, args.count // 5)
+        report('send_code_to_remote', protocol, f'{size}B', *closed_loop(send(size), count))
+
+    for rate in RATES:
+        report('send_code_to_remote', protocol, f'{rate}/s', *open_loop(send(SIZES[0]), rate, args.duration))
+
+    for num_exprs in PRINT_EXPRS:
+        # Define the values by running the whole buffer, then select each
+        # name.
+        view = sublime.View(''.join(f'value_{ii} = {ii}\n' for ii in range(num_exprs)))
+        exec_remote.exec_current(view, recorder)
+        recorder.pop()[0].result()
+        for row in range(num_exprs):
+            begin = view.text_point(row, 0)
+            view.sel().add(sublime.Region(begin, begin + len(f'value_{row}')))
+
+        def request(ii):
+            exec_remote.print_selected_values(view, recorder)
+            return recorder.pop()
+        report('print_selected_values', protocol, f'{num_exprs} expr', *closed_loop(request, args.count))
+
+    for num_modules in RELOAD_MODULES:
+        view = sublime.View('', file_name=make_package(package_root, num_modules))
+
+        def request(ii):
+            exec_remote.reload_current_module(view, recorder)
+            return recorder.pop()
+        report('reload_current_module', protocol, f'{num_modules} mod', *closed_loop(request, args.count))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--count', type=int, default=50, help='requests per closed loop run')
+    parser.add_argument('--duration', type=float, default=2.0, help='seconds per open loop run')
+    parser.add_argument('--protocols', nargs='+', default=['file', 'framed'], choices=['file', 'framed'])
+    parser.add_argument('--length-prefixed', action='store_true',
+                        help="serve with the Blender add-on's length prefixed command port")
+    parser.add_argument('--stages', action='store_true', help='also print per stage latency')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as package_root:
+        process, port = start_fake_port(args.length_prefixed, package_root)
+        try:
+            print(f'{"benchmark":<22} {"protocol":<8} {"param":>10} {"count":>6} {"ops/s":>9} '
+                  f'{"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+            for protocol in args.protocols:
+                bench_protocol(protocol, port, args.length_prefixed, package_root, args)
+            if args.stages:
+                print()
+                exec_remote.DumpExecRemoteStatsCommand().run()
+        finally:
+            exec_remote.plugin_unloaded()
+            process.kill()
+            process.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+"""Times exec_remote.get_current_code against buffer size and selection
+count.  Time per line (or per selection) should stay flat as either grows.
+
+    python benchmarks/bench_get_current_code.py
+"""
+import os
+import sys
+import timeit
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCHMARKS_DIR, 'stubs'), os.path.dirname(BENCHMARKS_DIR)]
+
+import sublime
+import exec_remote
+
+
+LINE = '    node = cmds.createNode("transform", name="generated_%d")  # padding\n'
+
+
+def make_view(num_lines):
+    return sublime.View(''.join(LINE % ii for ii in range(num_lines)))
+
+
+def best_time(func, repeat=5):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat, number)) / number
+
+
+def bench_buffer_size():
+    print('Whole buffer, no selection')
+    print(f'{"lines":>10} {"total ms":>10} {"us/line":>10}')
+    for num_lines in (1250, 2500, 5000, 10000, 20000, 40000):
+        view = make_view(num_lines)
+        elapsed = best_time(lambda: exec_remote.get_current_code(view))
+        print(f'{num_lines:>10} {elapsed * 1e3:>10.3f} {elapsed / num_lines * 1e6:>10.3f}')
+
+
+def bench_selection_count():
+    num_lines = 20000
+    view = make_view(num_lines)
+    print(f'\nOne-line selections spread over {num_lines} lines')
+    print(f'{"selections":>10} {"total ms":>10} {"us/sel":>10}')
+    for num_sels in (25, 50, 100, 200, 400, 800, 1600):
+        step = num_lines // num_sels
+        view.sel().clear()
+        for row in range(0, num_lines, step):
+            begin = view.text_point(row, 4)
+            view.sel().add(sublime.Region(begin, view.text_point(row + 1, 0) - 1))
+        elapsed = best_time(lambda: exec_remote.get_current_code(view))
+        print(f'{len(view.sel()):>10} {elapsed * 1e3:>10.3f} {elapsed / len(view.sel()) * 1e6:>10.3f}')
+
+
+if __name__ == '__main__':
+    bench_buffer_size()
+    bench_selection_count()
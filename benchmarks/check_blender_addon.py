@@ -0,0 +1,101 @@
+"""Runs remote/exec_remote_blender.py headless against the stub bpy in
+benchmarks/stubs, the way Blender would: registers the add-on, pumps its
+timer on the main thread while clients send it commands, then unregisters
+it with a command still waiting to run.
+
+    python benchmarks/check_blender_addon.py
+
+Raises AssertionError if the add-on misbehaves.
+"""
+import __main__
+import os
+import socket
+import struct
+import sys
+import threading
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(BENCHMARKS_DIR, 'stubs'), os.path.join(os.path.dirname(BENCHMARKS_DIR), 'remote')]
+# Any free port.
+os.environ['EXEC_REMOTE_BLENDER_PORT'] = '0'
+
+import bpy
+import exec_remote_blender
+
+TIMEOUT = 5.0
+
+
+class Client:
+    """Sends commands from a background thread, as Sublime would, so the
+    main thread is free to pump the timer."""
+
+    def __init__(self, address):
+        self.sock = socket.create_connection(address, TIMEOUT)
+        self.replies = []
+        self.closed = threading.Event()
+
+    def send(self, source):
+        data = source.encode('utf-8')
+        self.sock.sendall(struct.pack('!I', len(data)) + data)
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _read(self):
+        try:
+            reply = self.sock.recv(2)
+        except OSError:
+            reply = b''
+        if reply:
+            self.replies.append(reply)
+        else:
+            self.closed.set()
+
+
+def pump_until(predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        bpy.app.timers.run_due()
+        time.sleep(0.001)
+
+
+def wait_until(predicate):
+    deadline = time.monotonic() + TIMEOUT
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.001)
+
+
+def main():
+    exec_remote_blender.register()
+    assert bpy.app.timers.is_registered(exec_remote_blender._tick)
+    server = exec_remote_blender._server
+    address = server.address
+
+    # Commands run on the main thread from the timer, and are answered once
+    # they have.
+    client = Client(address)
+    client.send('check_value = 42')
+    pump_until(lambda: client.replies)
+    assert client.replies == [b'\n\0'], client.replies
+    assert __main__.__dict__.pop('check_value') == 42
+
+    # A command still queued when the add-on is unregistered never runs, and
+    # its connection is closed instead of answered.  So is an idle one.
+    idle_client = Client(address)
+    idle_client.send('')
+    pump_until(lambda: idle_client.replies)
+    client.send('never_ran = True')
+    wait_until(lambda: server.commands.qsize() == 1)
+    exec_remote_blender.unregister()
+    assert not bpy.app.timers.is_registered(exec_remote_blender._tick)
+    assert exec_remote_blender._server is None
+    assert idle_client.sock.recv(2) == b'', 'idle connection left open'
+    wait_until(client.closed.is_set)
+    assert client.replies == [b'\n\0'], 'acknowledged a command that never ran'
+    assert 'never_ran' not in __main__.__dict__
+    print('ok')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""A stand-in for Maya's commandPort(sourceType='python'), for benchmarking
+exec_remote without a live Maya.
+
+Like Maya, it reads whatever arrives on the socket in recv(BUFFER_SIZE)
+sized pieces, runs each piece as Python in __main__ on a single "main"
+thread, and answers every piece with a nul terminated reply once it has
+run.  Stub maya.cmds and maya.mel modules are installed so the file
+protocol's template can read, compile and unlink code_filepath just as it
+does in Maya.
+
+With --length-prefixed, remote/exec_remote_blender.py's CommandPortServer
+is run instead, pumped from the main thread the way Blender's timer does.
+
+    python benchmarks/fake_command_port.py [--port 0] [--length-prefixed]
+
+The bound port is printed on the first line of stdout.  Anything the
+executed code prints afterwards is discarded.
+"""
+import __main__
+import argparse
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+import types
+
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REMOTE_DIR = os.path.join(os.path.dirname(BENCHMARKS_DIR), 'remote')
+
+# Maya's commandPort default.
+BUFFER_SIZE = 4096
+
+
+def install_fake_maya():
+    maya = types.ModuleType('maya')
+    cmds = types.ModuleType('maya.cmds')
+    mel = types.ModuleType('maya.mel')
+    cmds.undoInfo = lambda *args, **kwargs: None
+    cmds.inViewMessage = lambda *args, **kwargs: None
+    mel.eval = lambda command: None
+    maya.cmds = cmds
+    maya.mel = mel
+    sys.modules.update({'maya': maya, 'maya.cmds': cmds, 'maya.mel': mel})
+
+
+class FakeCommandPort:
+    def __init__(self, host, port, buffer_size=BUFFER_SIZE):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen()
+        self.address = self.sock.getsockname()
+        self.buffer_size = buffer_size
+        # Maya runs commands from every connection one at a time on its
+        # main thread.
+        self.main_thread_lock = threading.Lock()
+
+    def serve_forever(self):
+        while True:
+            conn, _ = self.sock.accept()
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        try:
+            while True:
+                data = conn.recv(self.buffer_size)
+                if not data:
+                    break
+                with self.main_thread_lock:
+                    try:
+                        exec(compile(data.decode('utf-8'), '<commandPort>', 'exec'), __main__.__dict__)
+                    except Exception:
+                        traceback.print_exc()
+                conn.sendall(b'\n\0')
+        except (OSError, UnicodeDecodeError):
+            pass
+        finally:
+            conn.close()
+
+
+def serve_length_prefixed(host, port):
+    sys.path.insert(0, REMOTE_DIR)
+    import exec_remote_blender
+
+    server = exec_remote_blender.CommandPortServer(host, port)
+    server.start()
+    announce(server.address)
+    while True:
+        time.sleep(server.run_pending())
+
+
+def announce(address):
+    print(address[1], flush=True)
+    sys.stdout = open(os.devnull, 'w')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--length-prefixed', action='store_true')
+    args = parser.parse_args()
+
+    install_fake_maya()
+    if args.length_prefixed:
+        serve_length_prefixed(args.host, args.port)
+    else:
+        server = FakeCommandPort(args.host, args.port)
+        announce(server.address)
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,40 @@
+"""Just enough of bpy to register remote/exec_remote_blender.py outside of
+Blender."""
+import time
+import types
+
+
+class Timers:
+    def __init__(self):
+        # function -> time it's next due
+        self.due = {}
+
+    def register(self, function, first_interval=0.0, persistent=False):
+        self.due[function] = time.monotonic() + first_interval
+
+    def unregister(self, function):
+        if function not in self.due:
+            raise ValueError(f'{function} is not registered')
+        del self.due[function]
+
+    def is_registered(self, function):
+        return function in self.due
+
+    def run_due(self):
+        """Calls the timers that are due, as Blender's event loop does.  A
+        timer that returns None is unregistered, otherwise it's due again
+        after the number of seconds it returned."""
+        now = time.monotonic()
+        for function, due in list(self.due.items()):
+            if due > now or function not in self.due:
+                continue
+            interval = function()
+            if function not in self.due:
+                continue
+            if interval is None:
+                del self.due[function]
+            else:
+                self.due[function] = time.monotonic() + interval
+
+
+app = types.SimpleNamespace(timers=Timers())
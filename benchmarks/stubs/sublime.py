@@ -0,0 +1,150 @@
+"""Just enough of Sublime's API to import and drive the plugins in this
+package outside of Sublime, for benchmarking."""
+import bisect
+
+
+class Region:
+    def __init__(self, a, b=None, xpos=-1):
+        self.a = a
+        self.b = a if b is None else b
+        self.xpos = xpos
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.b - self.a)
+
+    def empty(self):
+        return self.a == self.b
+
+    def __eq__(self, other):
+        return (self.a, self.b) == (other.a, other.b)
+
+    def __repr__(self):
+        return f'Region({self.a}, {self.b})'
+
+
+class Selection(list):
+    def add(self, region):
+        self.append(region)
+
+    def add_all(self, regions):
+        self.extend(regions)
+
+
+class Syntax:
+    def __init__(self, name):
+        self.name = name
+
+
+class Settings(dict):
+    def get(self, key, default=None):
+        return dict.get(self, key, default)
+
+    def set(self, key, value):
+        self[key] = value
+
+    def add_on_change(self, tag, callback):
+        pass
+
+    def clear_on_change(self, tag):
+        pass
+
+
+class View:
+    """An in-memory view over a fixed string."""
+
+    _next_id = 1
+
+    def __init__(self, text, syntax='Python', file_name=None):
+        self._id = View._next_id
+        View._next_id += 1
+        self.text = text
+        self._syntax = Syntax(syntax)
+        self._file_name = file_name
+        self._sel = Selection()
+        self._settings = Settings()
+        self.line_starts = [0]
+        pos = text.find('\n')
+        while pos != -1:
+            self.line_starts.append(pos + 1)
+            pos = text.find('\n', pos + 1)
+
+    def id(self):
+        return self._id
+
+    def size(self):
+        return len(self.text)
+
+    def substr(self, region):
+        if isinstance(region, int):
+            return self.text[region:region + 1]
+        return self.text[region.begin():region.end()]
+
+    def rowcol(self, point):
+        row = bisect.bisect_right(self.line_starts, point) - 1
+        return row, point - self.line_starts[row]
+
+    def text_point(self, row, col):
+        return self.line_starts[row] + col
+
+    def sel(self):
+        return self._sel
+
+    def syntax(self):
+        return self._syntax
+
+    def settings(self):
+        return self._settings
+
+    def file_name(self):
+        return self._file_name
+
+    def is_dirty(self):
+        return False
+
+    def run_command(self, cmd, args=None):
+        pass
+
+
+_settings = {}
+
+
+def load_settings(name):
+    return _settings.setdefault(name, Settings())
+
+
+def save_settings(name):
+    pass
+
+
+def error_message(msg):
+    print(f'error_message: {msg}')
+
+
+def status_message(msg):
+    pass
+
+
+def set_timeout(callback, delay=0):
+    callback()
+
+
+def set_timeout_async(callback, delay=0):
+    callback()
+
+
+def platform():
+    return 'linux'
+
+
+def packages_path():
+    return ''
+
+
+def active_window():
+    return None
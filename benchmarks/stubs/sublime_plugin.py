@@ -0,0 +1,32 @@
+class Command:
+    def name(self):
+        return type(self).__name__
+
+    def run_(self, edit_token, args):
+        return self.run(**(args or {}))
+
+
+class TextCommand(Command):
+    def __init__(self, view):
+        self.view = view
+
+    def run_(self, edit_token, args):
+        return self.run(edit_token, **(args or {}))
+
+
+class WindowCommand(Command):
+    def __init__(self, window):
+        self.window = window
+
+
+class ApplicationCommand(Command):
+    pass
+
+
+class EventListener:
+    pass
+
+
+class ViewEventListener:
+    def __init__(self, view):
+        self.view = view
@@ -1,7 +1,146 @@
+import bisect
+
 import sublime
 import sublime_plugin
 
 
+# Gaps between matched lines no longer than this on either side are
+# diffed line by line.  Longer ones are only matched up on lines that are
+# unique to both sides, and replaced whole if there aren't any.
+SMALL_GAP_LINES = 64
+# Lines looked at while matching, past which any differences left are
+# replaced whole, so even huge, very different buffers diff quickly.
+MAX_DIFF_WORK = 4000000
+
+
+def split_lines(text):
+    lines = text.split('\n')
+    for ii in range(len(lines) - 1):
+        lines[ii] += '\n'
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def unique_anchors(old, new, old_lo, old_hi, new_lo, new_hi):
+    """Returns the (old index, new index) of the lines that appear exactly
+    once on each side, keeping the longest run of them that's in the same
+    order on both."""
+    # line -> its index, or None if it appears more than once
+    old_index = {}
+    for ii in range(old_lo, old_hi):
+        old_index[old[ii]] = None if old[ii] in old_index else ii
+    new_index = {}
+    for ii in range(new_lo, new_hi):
+        new_index[new[ii]] = None if new[ii] in new_index else ii
+    pairs = []
+    for ii in range(old_lo, old_hi):
+        line = old[ii]
+        if old_index[line] is not None and new_index.get(line) is not None:
+            pairs.append((ii, new_index[line]))
+
+    # Longest increasing run of new indices, by patience sorting.
+    tails = []
+    tail_pairs = []
+    previous = []
+    for kk, (_, new_ii) in enumerate(pairs):
+        pos = bisect.bisect_left(tails, new_ii)
+        if pos == len(tails):
+            tails.append(new_ii)
+            tail_pairs.append(kk)
+        else:
+            tails[pos] = new_ii
+            tail_pairs[pos] = kk
+        previous.append(tail_pairs[pos - 1] if pos else None)
+    anchors = []
+    kk = tail_pairs[-1] if tail_pairs else None
+    while kk is not None:
+        anchors.append(pairs[kk])
+        kk = previous[kk]
+    anchors.reverse()
+    return anchors
+
+
+def match_lines(old, new):
+    """Returns the (old index, new index) of every line kept from old in new,
+    in order.
+
+    This is a patience diff: lines unique to both sides anchor the match,
+    and the gaps between anchors are matched the same way.  Each pass is
+    linear in the size of its gap, so edits spread all over a big buffer
+    cost little more than one.
+    """
+    matches = []
+    work = 0
+    gaps = [(0, len(old), 0, len(new))]
+    while gaps:
+        old_lo, old_hi, new_lo, new_hi = gaps.pop()
+        while old_lo < old_hi and new_lo < new_hi and old[old_lo] == new[new_lo]:
+            matches.append((old_lo, new_lo))
+            old_lo += 1
+            new_lo += 1
+        while old_lo < old_hi and new_lo < new_hi and old[old_hi - 1] == new[new_hi - 1]:
+            old_hi -= 1
+            new_hi -= 1
+            matches.append((old_hi, new_hi))
+        if old_lo == old_hi or new_lo == new_hi:
+            continue
+        work += old_hi - old_lo + new_hi - new_lo
+        if work > MAX_DIFF_WORK:
+            continue
+
+        if old_hi - old_lo <= SMALL_GAP_LINES and new_hi - new_lo <= SMALL_GAP_LINES:
+            import difflib
+            matcher = difflib.SequenceMatcher(None, old[old_lo:old_hi], new[new_lo:new_hi], autojunk=False)
+            for old_ii, new_ii, size in matcher.get_matching_blocks():
+                matches.extend((old_lo + old_ii + kk, new_lo + new_ii + kk) for kk in range(size))
+            continue
+
+        anchors = unique_anchors(old, new, old_lo, old_hi, new_lo, new_hi)
+        for old_ii, new_ii in anchors:
+            matches.append((old_ii, new_ii))
+            gaps.append((old_lo, old_ii, new_lo, new_ii))
+            old_lo = old_ii + 1
+            new_lo = new_ii + 1
+        if anchors:
+            gaps.append((old_lo, old_hi, new_lo, new_hi))
+    matches.sort()
+    return matches
+
+
+def diff_edits(old, new):
+    """Returns the edits that turn old into new, as (begin, end, text) over
+    old, in order, touching as little as possible.  Whole lines are
+    compared."""
+    old_lines = split_lines(old)
+    new_lines = split_lines(new)
+    # Offset of the start of each old line, and of the end of the last.
+    old_offsets = [0]
+    for line in old_lines:
+        old_offsets.append(old_offsets[-1] + len(line))
+
+    edits = []
+    old_next = new_next = 0
+    for old_ii, new_ii in match_lines(old_lines, new_lines) + [(len(old_lines), len(new_lines))]:
+        if old_ii > old_next or new_ii > new_next:
+            edits.append((old_offsets[old_next], old_offsets[old_ii], ''.join(new_lines[new_next:new_ii])))
+        old_next = old_ii + 1
+        new_next = new_ii + 1
+    return edits
+
+
+def map_point(point, edits, edit_begins, shifts):
+    # shifts[ii] is how far everything after edit ii - 1 has moved.
+    ii = bisect.bisect_right(edit_begins, point) - 1
+    if ii < 0:
+        return point
+    begin, end, text = edits[ii]
+    if point >= end:
+        return point + shifts[ii + 1]
+    # Inside a replaced hunk, keep the same distance into the new text.
+    return begin + shifts[ii] + min(point - begin, len(text))
+
+
 class CopyEntireBufferCommand(sublime_plugin.TextCommand):
     def description(self):
         return 'Copy Entire Buffer'
@@ -19,14 +158,41 @@ class PasteEntireBufferCommand(sublime_plugin.TextCommand):
     def description(self):
         return 'Paste Entire Buffer'
 
-    def run(self, edit):
+    def run(self, edit, diff=True):
+        """With diff set, only the lines that differ from the clipboard are
+        replaced, so folds, marks and undo history elsewhere in the buffer are
+        left alone, and the selections move with the edits."""
         if self.view.settings().get('is_widget'):
             return
 
         text = sublime.get_clipboard()
-        if text:
-            selected_regions = tuple([region for region in self.view.sel()])
-            entire_buffer = sublime.Region(0, self.view.size())
+        if not text:
+            return
+        selected_regions = tuple([region for region in self.view.sel()])
+        entire_buffer = sublime.Region(0, self.view.size())
+        if not diff:
             self.view.replace(edit, entire_buffer, text)
             self.view.sel().clear()
             self.view.sel().add_all(selected_regions)
+            return
+
+        # Buffers always use \n, whatever the file's line endings.
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        old_text = self.view.substr(entire_buffer)
+        if text == old_text:
+            return
+        edits = diff_edits(old_text, text)
+
+        # Apply from the end back, so the edits still to be applied don't
+        # move.
+        for begin, end, new_text in reversed(edits):
+            self.view.replace(edit, sublime.Region(begin, end), new_text)
+
+        edit_begins = [begin for begin, _, _ in edits]
+        shifts = [0]
+        for begin, end, new_text in edits:
+            shifts.append(shifts[-1] + len(new_text) - (end - begin))
+        self.view.sel().clear()
+        self.view.sel().add_all([
+            sublime.Region(map_point(r.a, edits, edit_begins, shifts), map_point(r.b, edits, edit_begins, shifts))
+            for r in selected_regions])
@@ -1,18 +1,74 @@
+import re
+
 import sublime
 import sublime_plugin
 
 
+def split_lines(text):
+    # Each line keeps its own newline, so dropping the last line of a buffer
+    # with no trailing newline leaves the newline before it, as erasing its
+    # full_line would.
+    lines = [line + '\n' for line in text.split('\n')]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+def get_filter_regions(view):
+    # Each selection covers the whole lines it touches, merged where they
+    # overlap.  With nothing selected, filter from the caret's line to the
+    # end of the buffer.
+    regions = []
+    for r in view.sel():
+        if r.empty():
+            continue
+        end = r.end()
+        # Selecting whole lines (shift+down, dragging in the gutter) ends
+        # the selection at the start of the next line, which isn't part of
+        # it.
+        if view.line(end).begin() == end:
+            end -= 1
+        regions.append(view.full_line(sublime.Region(r.begin(), end)))
+    if not regions:
+        return [sublime.Region(view.line(view.sel()[0].begin()).begin(), view.size())]
+    regions.sort(key=lambda r: r.begin())
+    merged = [regions[0]]
+    for region in regions[1:]:
+        if region.begin() <= merged[-1].end():
+            merged[-1] = sublime.Region(merged[-1].begin(), max(merged[-1].end(), region.end()))
+        else:
+            merged.append(region)
+    return merged
+
+
 class DeleteAlternateLinesCommand(sublime_plugin.TextCommand):
-    def run(self, edit):
+    """Keeps every Nth line (every=2 deletes alternate lines) and/or drops
+    lines matching the regex pattern, within each selection.
+
+    Each selection is rewritten with a single replace, so even huge logs
+    are filtered in one pass and undone in one step.
+    """
+
+    def run(self, edit, every=None, pattern=None):
         sel = self.view.sel()
         if not sel:
             return
 
-        cur_line = self.view.full_line(sel[0].begin())
+        if every is None:
+            every = 1 if pattern else 2
+        every = max(1, int(every))
+        try:
+            regex = re.compile(pattern) if pattern else None
+        except re.error as ex:
+            return sublime.error_message(f'Bad pattern {pattern!r}: {ex}')
 
-        while True:
-            kill_line = self.view.full_line(cur_line.end())
-            self.view.erase(edit, kill_line)
-            cur_line = self.view.full_line(kill_line.begin())
-            if cur_line.end() == self.view.size():
-                break
+        # Replace from the end of the buffer back, so the regions still to be
+        # replaced don't move.
+        for region in reversed(get_filter_regions(self.view)):
+            lines = split_lines(self.view.substr(region))
+            kept = lines[::every]
+            if regex:
+                kept = [line for line in kept if not regex.search(line)]
+            if len(kept) != len(lines):
+                self.view.replace(edit, region, ''.join(kept))
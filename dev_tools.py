@@ -1,7 +1,51 @@
+import bisect
+import collections
+import fnmatch
+import json
+import os
+import threading
+import time
+import types
+
 import sublime
 import sublime_plugin
 
 
+# Longest a command or synchronous event hook can take on the UI thread
+# without costing a frame at 60Hz.
+FRAME_BUDGET_MS = 1000.0 / 60
+# Upper bounds of the histogram buckets in ms, doubling from 0.1ms.
+# Anything slower goes in one more bucket on the end.
+BUCKET_BOUNDS_MS = [0.1 * 2 ** ii for ii in range(16)]
+# Overruns of the same entry are reported at most this often, in seconds.
+OVERRUN_REPORT_INTERVAL = 1.0
+
+# Rough relative cost of indexing: every file is looked at, and text files
+# are read and parsed for symbols.
+INDEX_COST_PER_FILE = 1.0
+INDEX_COST_PER_TEXT_KB = 0.25
+# Files worth having in the index, and text files that cost as much to
+# index but only hold serialized data.
+SOURCE_EXTENSIONS = {
+    '.c', '.cc', '.cginc', '.compute', '.cpp', '.cs', '.glsl', '.go', '.h', '.hlsl', '.hpp', '.java', '.js',
+    '.lua', '.mel', '.py', '.rs', '.shader', '.ts',
+}
+DATA_EXTENSIONS = {
+    '.anim', '.asset', '.controller', '.csv', '.log', '.mat', '.meta', '.physicmaterial', '.prefab',
+    '.unity',
+}
+# Folder names that only ever hold generated files.
+GENERATED_FOLDER_NAMES = {
+    '__pycache__', '.vs', 'Build', 'Builds', 'DerivedDataCache', 'Intermediate', 'Library', 'Logs',
+    'node_modules', 'obj', 'Temp',
+}
+# A folder is suggested for exclusion once it's at least this share of the
+# total cost and at most this share of its files are source.
+ADVISOR_MIN_COST_SHARE = 0.05
+ADVISOR_MAX_SOURCE_SHARE = 0.01
+ADVISOR_REPORT_ROWS = 25
+
+
 class ToggleCommandLoggingCommand(sublime_plugin.WindowCommand):
     def __init__(self, window):
         super(ToggleCommandLoggingCommand, self).__init__(window)
@@ -32,3 +76,383 @@ class ToggleIndexingCommand(sublime_plugin.TextCommand):
 
     def description(self):
         return 'Indexing'
+
+
+class LatencyHistogram(object):
+    __slots__ = ('count', 'total_ms', 'max_ms', 'over_budget', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.over_budget = 0
+        self.buckets = [0] * (len(BUCKET_BOUNDS_MS) + 1)
+
+    def add(self, ms, budget_ms):
+        self.count += 1
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect.bisect_left(BUCKET_BOUNDS_MS, ms)] += 1
+        if budget_ms is not None and ms > budget_ms:
+            self.over_budget += 1
+
+    def percentile(self, fraction):
+        # The upper bound of the bucket the sample falls in, or the slowest
+        # sample if that's lower.
+        rank = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKET_BOUNDS_MS[index], self.max_ms) if index < len(BUCKET_BOUNDS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'total_ms': self.total_ms,
+            'mean_ms': self.total_ms / self.count if self.count else 0.0,
+            'p50_ms': self.percentile(0.50),
+            'p95_ms': self.percentile(0.95),
+            'p99_ms': self.percentile(0.99),
+            'max_ms': self.max_ms,
+            'over_budget': self.over_budget,
+            'buckets': self.buckets,
+        }
+
+
+class LatencyProfiler(object):
+    """Times every command and event listener hook while started, by
+    wrapping the run_ method of Sublime's command base classes and the hook
+    methods of every loaded listener class.
+
+    Listeners loaded (or reloaded) after start() aren't timed until the
+    profiler is restarted.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> LatencyHistogram
+        self.histograms = {}
+        self.last_overrun_report = {}
+        # (owner, name, original function), to undo the wrapping
+        self.patches = []
+
+    @property
+    def running(self):
+        return bool(self.patches)
+
+    def start(self):
+        if self.running:
+            return
+        for command_class in (
+                sublime_plugin.ApplicationCommand, sublime_plugin.WindowCommand, sublime_plugin.TextCommand):
+            # run_ is defined on Command and only overridden by TextCommand,
+            # so wrap it wherever each class gets it from, once.
+            owner = next(cls for cls in command_class.__mro__ if 'run_' in vars(cls))
+            if not self.is_patched(owner, 'run_'):
+                self.patch(owner, 'run_', lambda command: 'command ' + command.name(), FRAME_BUDGET_MS)
+
+        listener_classes = set(getattr(sublime_plugin, 'view_event_listener_classes', []))
+        for listeners in getattr(sublime_plugin, 'all_callbacks', {}).values():
+            listener_classes.update(type(listener) for listener in listeners)
+        for listener_class in listener_classes:
+            for owner in listener_class.__mro__:
+                if owner.__module__ == sublime_plugin.__name__ or owner is object:
+                    continue
+                for name, value in list(vars(owner).items()):
+                    if not name.startswith('on_') or not isinstance(value, types.FunctionType):
+                        continue
+                    if self.is_patched(owner, name):
+                        continue
+                    key = f'hook {owner.__module__}.{owner.__name__}.{name}'
+                    # Async hooks don't hold up the UI thread.
+                    budget_ms = None if name.endswith('_async') else FRAME_BUDGET_MS
+                    self.patch(owner, name, lambda _, key=key: key, budget_ms)
+
+    def stop(self):
+        for owner, name, original in reversed(self.patches):
+            setattr(owner, name, original)
+        self.patches = []
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.last_overrun_report.clear()
+
+    def is_patched(self, owner, name):
+        return any(patch[0] is owner and patch[1] == name for patch in self.patches)
+
+    def patch(self, owner, name, get_key, budget_ms):
+        original = vars(owner)[name]
+        profiler = self
+
+        def wrapper(self, *args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return original(self, *args, **kwargs)
+            finally:
+                profiler.record(get_key(self), (time.perf_counter() - start) * 1000, budget_ms)
+
+        wrapper.__name__ = original.__name__
+        wrapper.__doc__ = original.__doc__
+        setattr(owner, name, wrapper)
+        self.patches.append((owner, name, original))
+
+    def record(self, key, ms, budget_ms):
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.add(ms, budget_ms)
+            if budget_ms is None or ms <= budget_ms:
+                return
+            now = time.monotonic()
+            if now - self.last_overrun_report.get(key, 0.0) < OVERRUN_REPORT_INTERVAL:
+                return
+            self.last_overrun_report[key] = now
+        print(f'Latency profiler: {key} took {ms:.1f}ms (frame budget {budget_ms:.1f}ms)')
+
+    def hottest(self, count):
+        with self.lock:
+            entries = [dict(key=key, **histogram.to_dict()) for key, histogram in self.histograms.items()]
+        entries.sort(key=lambda entry: entry['total_ms'], reverse=True)
+        return entries[:count]
+
+
+_latency_profiler = LatencyProfiler()
+
+
+def plugin_unloaded():
+    _latency_profiler.stop()
+
+
+class ToggleLatencyProfilingCommand(sublime_plugin.ApplicationCommand):
+    def run(self):
+        if _latency_profiler.running:
+            _latency_profiler.stop()
+        else:
+            _latency_profiler.reset()
+            _latency_profiler.start()
+            print(f'Latency profiler: timing {len(_latency_profiler.patches)} commands and hooks')
+
+    def is_checked(self):
+        return _latency_profiler.running
+
+    def description(self):
+        return 'Latency Profiling'
+
+
+class ExportLatencyProfileCommand(sublime_plugin.ApplicationCommand):
+    """Writes the entries with the most total time to file_path as JSON, and
+    prints a summary of them."""
+
+    def run(self, file_path='~/sublime_latency_profile.json', count=50):
+        entries = _latency_profiler.hottest(count)
+        file_path = os.path.expanduser(file_path)
+        with open(file_path, 'w', encoding='utf-8') as fp:
+            json.dump({
+                'time': time.time(),
+                'frame_budget_ms': FRAME_BUDGET_MS,
+                'bucket_bounds_ms': BUCKET_BOUNDS_MS,
+                'entries': entries,
+            }, fp, indent=4)
+
+        print(f'Latency profiler: wrote {len(entries)} entries to {file_path}')
+        print(f'  {"key":<64} {"count":>7} {"total":>9} {"p50":>7} {"p95":>7} {"max":>9} {"over":>5}')
+        for entry in entries[:20]:
+            print('  {key:<64} {count:>7} {total_ms:>9.1f} {p50_ms:>7.1f} {p95_ms:>7.1f} {max_ms:>9.1f} '
+                  '{over_budget:>5}'.format(**entry))
+
+    def is_enabled(self):
+        return bool(_latency_profiler.histograms)
+
+
+class FolderCost(object):
+    __slots__ = ('files', 'bytes', 'source_files', 'cost', 'extension_costs')
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.source_files = 0
+        self.cost = 0.0
+        self.extension_costs = collections.Counter()
+
+    def add_file(self, extension, size):
+        self.files += 1
+        self.bytes += size
+        cost = INDEX_COST_PER_FILE
+        if extension in SOURCE_EXTENSIONS:
+            self.source_files += 1
+            cost += size / 1024 * INDEX_COST_PER_TEXT_KB
+        elif extension in DATA_EXTENSIONS:
+            cost += size / 1024 * INDEX_COST_PER_TEXT_KB
+        self.cost += cost
+        self.extension_costs[extension or '(none)'] += cost
+
+    def add(self, other):
+        self.files += other.files
+        self.bytes += other.bytes
+        self.source_files += other.source_files
+        self.cost += other.cost
+        self.extension_costs.update(other.extension_costs)
+
+
+def scan_index_cost(root, folder_exclude_patterns):
+    """Returns {folder path: FolderCost} for root and every folder under it,
+    each covering everything beneath it."""
+    own_costs = {}
+    stack = [root]
+    while stack:
+        dir_path = stack.pop()
+        cost = own_costs[dir_path] = FolderCost()
+        try:
+            entries = list(os.scandir(dir_path))
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_symlink():
+                    continue
+                if entry.is_dir():
+                    if not any(fnmatch.fnmatch(entry.name, pattern) for pattern in folder_exclude_patterns):
+                        stack.append(entry.path)
+                elif entry.is_file():
+                    cost.add_file(os.path.splitext(entry.name)[1].lower(), entry.stat().st_size)
+            except OSError:
+                pass
+
+    # Roll each folder up into its parent, deepest first.
+    for dir_path in sorted(own_costs, key=lambda path: path.count(os.sep), reverse=True):
+        if dir_path != root:
+            own_costs[os.path.dirname(dir_path)].add(own_costs[dir_path])
+    return own_costs
+
+
+def is_within(path, root):
+    try:
+        return os.path.commonpath([path, root]) == root
+    except ValueError:
+        # On different drives.
+        return False
+
+
+def outermost_folders(folders):
+    """Returns folders without any that are inside another one, so nothing
+    is scanned (or counted) twice."""
+    roots = []
+    for folder in sorted({os.path.normpath(folder) for folder in folders}, key=len):
+        if not any(is_within(folder, root) for root in roots):
+            roots.append(folder)
+    return roots
+
+
+def suggest_index_excludes(roots, costs):
+    """Returns (folder_exclude_patterns, index_exclude_patterns) for the
+    folders and file types that cost the most to index for the least
+    source."""
+    def is_asset_only(cost):
+        return cost.source_files / max(1, cost.files) <= ADVISOR_MAX_SOURCE_SHARE
+
+    # A folder name excludes every folder of that name, so it's only
+    # suggested if none of them hold source.
+    names_with_source = {
+        os.path.basename(dir_path) for dir_path, cost in costs.items() if not is_asset_only(cost)}
+
+    total_cost = sum(costs[root].cost for root in roots) or 1.0
+    folder_patterns = set()
+    index_patterns = set()
+    excluded = []
+    for dir_path in sorted(costs, key=lambda path: costs[path].cost, reverse=True):
+        cost = costs[dir_path]
+        if cost.cost / total_cost < ADVISOR_MIN_COST_SHARE:
+            break
+        if dir_path in roots or any(is_within(dir_path, parent) for parent in excluded):
+            continue
+        if not is_asset_only(cost):
+            continue
+        name = os.path.basename(dir_path)
+        if name in GENERATED_FOLDER_NAMES and name not in names_with_source:
+            folder_patterns.add(name)
+        else:
+            root = next(root for root in roots if is_within(dir_path, root))
+            index_patterns.add('*/{}/*'.format(os.path.relpath(dir_path, root).replace(os.sep, '/')))
+        excluded.append(dir_path)
+
+    # Data files are worth leaving out wherever they are.
+    extension_costs = collections.Counter()
+    for root in roots:
+        extension_costs.update(costs[root].extension_costs)
+    for extension, cost in extension_costs.items():
+        if extension in DATA_EXTENSIONS and cost / total_cost >= ADVISOR_MIN_COST_SHARE / 5:
+            index_patterns.add('*' + extension)
+    return sorted(folder_patterns), sorted(index_patterns)
+
+
+class AdviseIndexExcludesCommand(sublime_plugin.WindowCommand):
+    """Scans the window's folders for what costs the most to index, reports
+    the most expensive folders, and adds suggested folder_exclude_patterns
+    and index_exclude_patterns to the project settings (unless apply is
+    false), so indexing can stay on for the rest."""
+
+    def run(self, apply=True):
+        roots = outermost_folders(self.window.folders())
+        if not roots:
+            return sublime.error_message('Index advisor: no folders open.')
+        settings = sublime.load_settings('Preferences.sublime-settings')
+        project_settings = (self.window.project_data() or {}).get('settings', {})
+        folder_exclude_patterns = project_settings.get(
+            'folder_exclude_patterns', settings.get('folder_exclude_patterns', []))
+        sublime.status_message('Index advisor: scanning...')
+        threading.Thread(
+            target=self.scan, args=(roots, folder_exclude_patterns, apply), name='index advisor', daemon=True).start()
+
+    def scan(self, roots, folder_exclude_patterns, apply):
+        start = time.perf_counter()
+        costs = {}
+        for root in roots:
+            costs.update(scan_index_cost(root, folder_exclude_patterns))
+        elapsed = time.perf_counter() - start
+        suggestions = suggest_index_excludes(roots, costs)
+        sublime.set_timeout(lambda: self.report(roots, costs, suggestions, elapsed, apply))
+
+    def report(self, roots, costs, suggestions, elapsed, apply):
+        folder_patterns, index_patterns = suggestions
+        total_cost = sum(costs[root].cost for root in roots) or 1.0
+        lines = [
+            f'Index cost of {", ".join(roots)} (scanned {len(costs)} folders in {elapsed:.1f}s)',
+            '',
+            f'{"cost %":>7} {"files":>9} {"MB":>9} {"source %":>9}  folder (top file types by cost)',
+        ]
+        for dir_path in sorted(costs, key=lambda path: costs[path].cost, reverse=True)[:ADVISOR_REPORT_ROWS]:
+            cost = costs[dir_path]
+            extensions = ', '.join(
+                f'{extension} {extension_cost / cost.cost:.0%}'
+                for extension, extension_cost in cost.extension_costs.most_common(3))
+            lines.append(
+                f'{cost.cost / total_cost:>7.1%} {cost.files:>9} {cost.bytes / 1e6:>9.1f} '
+                f'{cost.source_files / max(1, cost.files):>9.1%}  {dir_path} ({extensions})')
+        lines += ['', 'Suggested folder_exclude_patterns: ' + json.dumps(folder_patterns),
+                  'Suggested index_exclude_patterns: ' + json.dumps(index_patterns)]
+
+        if apply and (folder_patterns or index_patterns):
+            project_data = self.window.project_data() or {
+                'folders': [{'path': folder} for folder in self.window.folders()]}
+            project_settings = project_data.setdefault('settings', {})
+            preferences = sublime.load_settings('Preferences.sublime-settings')
+            for key, patterns in (('folder_exclude_patterns', folder_patterns),
+                                  ('index_exclude_patterns', index_patterns)):
+                # Project settings replace the user's, so start from those.
+                existing = project_settings.get(key, preferences.get(key, []))
+                project_settings[key] = existing + [pattern for pattern in patterns if pattern not in existing]
+            self.window.set_project_data(project_data)
+            lines.append('Added to the project settings.')
+
+        view = self.window.new_file()
+        view.set_name('Index Cost Report')
+        view.set_scratch(True)
+        view.run_command('append', {'characters': '\n'.join(lines) + '\n'})
+        view.set_read_only(True)
+
+    def is_enabled(self):
+        return bool(self.window.folders())
@@ -1,12 +1,25 @@
-from dataclasses import dataclass
+# ast, base64, concurrent.futures, hashlib, socket, struct and tempfile are
+# imported where they're used, so sessions that never talk to a remote
+# don't pay for them when the plugin host starts.
+import collections
+import contextlib
+import functools
+import itertools
+import json
+import math
 import os
-import socket
-import tempfile
 import textwrap
+import threading
+import time
 
 import sublime
 import sublime_plugin
 
+if __package__:
+    from .view_appender import ViewAppender
+else:
+    # Imported on its own, outside Sublime (see benchmarks/).
+    from view_appender import ViewAppender
 
 THIS_MODULE_NAME = os.path.splitext(os.path.basename(__file__))[0]
 
@@ -51,7 +64,7 @@ EXEC_CODE_TEMPLATES = {
                 code = compile(source, "{code_filepath}", 'exec')
                 exec(code, __main__.__dict__, __main__.__dict__)
             else:
-                maya.mel.eval('rehash; source "{code_filepath}"')
+                maya.mel.eval('{mel_rehash}source "{code_filepath}"')
             msg = f'<span style="color:rgb(255,192,192)">{{now_str}}: Evaluated Sublime code</span>'
             maya.cmds.inViewMessage(statusMessage=msg, fade=True, fadeInTime=0, fadeStayTime=500, fadeOutTime=500)
             # Hack to forces inViewMessage to show when Maya window doesn't have focus
@@ -69,33 +82,184 @@ EXEC_CODE_TEMPLATES = {
         '''),
 }
 
+# Module installed in the remote interpreter once per connection that
+# reassembles the frames of each request.  Every frame carries the total
+# length of the request so a frame lost to a dropped connection is caught
+# before anything is executed.
+RECEIVER_SOURCE = textwrap.dedent('''
+    import base64
+    pending = {}
+    def feed(request_id, offset, length, data):
+        buf = pending.setdefault(request_id, bytearray())
+        if buf is None or len(buf) != offset:
+            pending[request_id] = None
+            return
+        buf += base64.b64decode(data)
+        if len(buf) > length:
+            pending[request_id] = None
+        elif len(buf) == length:
+            pending[request_id] = bytes(buf)
+    def take(request_id):
+        data = pending.pop(request_id, b'')
+        if not isinstance(data, bytes):
+            raise RuntimeError(f'Request {request_id} was not received intact')
+        return data.decode('utf-8')
+    ''')
+
+RECEIVER_INSTALL_TEMPLATE = textwrap.dedent('''
+    import sys
+    import types
+    if '{receiver_name}' not in sys.modules:
+        __receiver = types.ModuleType('{receiver_name}')
+        exec({receiver_source!r}, __receiver.__dict__)
+        sys.modules['{receiver_name}'] = __receiver
+        del __receiver
+    ''')
+
+FRAME_TEMPLATE = "__import__('sys').modules['{receiver_name}'].feed('{request_id}', {offset}, {length}, '{data}')\n"
+
+# Installs the agent (remote/exec_remote_agent.py) from frames sent under
+# request_id.  An agent of the same version that's already running is kept,
+# along with its cache.
+AGENT_INSTALL_TEMPLATE = textwrap.dedent('''
+    import sys
+    import types
+    __agent = sys.modules.get('{agent_name}')
+    __source = sys.modules['{receiver_name}'].take('{request_id}')
+    if getattr(__agent, 'VERSION', None) != '{version}':
+        __agent = types.ModuleType('{agent_name}')
+        exec(compile(__source, '<{agent_name}>', 'exec'), __agent.__dict__)
+        __agent.VERSION = '{version}'
+        sys.modules['{agent_name}'] = __agent
+    __agent.RECEIVER_NAME = '{receiver_name}'
+    __agent.CACHE_SIZE = {cache_size}
+    __agent.MEL_REHASH = '{mel_rehash}'
+    del __agent, __source
+    ''')
+
+AGENT_ATTACH_OUTPUT_TEMPLATE = "__import__('sys').modules['{agent_name}'].attach_output('{session_id}', '{host}', {port}, '{label}')\n"
+
+AGENT_EXEC_TEMPLATE = "__import__('sys').modules['{agent_name}'].exec_code('{session_id}', '{request_id}', '{digest}', '{syntax}', {sent})\n"
+
+# Evaluates every expression in one go, in order.  reprs are capped on the
+# remote side so printing a huge value can't flood the command port.
 PRINT_EXPR_TEMPLATES = {
     'python': textwrap.dedent('''
-        try:
-            __eval_result = eval("{expr}")
-        except Exception as ex:
-            print('Error evaluating expression:', ex)
-        else:
-            print(f"{expr} =", repr(__eval_result))
+        def __print_exprs(exprs, max_repr):
+            import __main__
+            import reprlib
+            short_repr = reprlib.Repr()
+            short_repr.maxlevel = 4
+            short_repr.maxlist = short_repr.maxtuple = short_repr.maxset = short_repr.maxfrozenset = 1000
+            short_repr.maxdeque = short_repr.maxarray = short_repr.maxdict = 1000
+            short_repr.maxstring = short_repr.maxlong = short_repr.maxother = max_repr
+            for expr in exprs:
+                try:
+                    value = eval(expr, __main__.__dict__)
+                except Exception as ex:
+                    print(f'Error evaluating expression {{expr}}:', ex)
+                    continue
+                value_repr = short_repr.repr(value)
+                if len(value_repr) > max_repr:
+                    value_repr = value_repr[:max_repr] + f'... ({{len(value_repr) - max_repr}} more characters)'
+                print(f'{{expr}} =', value_repr)
+        __print_exprs({exprs!r}, {max_repr})
+        del __print_exprs
         '''),
 }
 
+# If the agent is running, it reloads whatever else in the package changed
+# along with the module, and everything that depends on them.
 RELOAD_TEMPLATES = {
     'python': textwrap.dedent('''
         import importlib
-        import {package_path}
-        importlib.reload({package_path})
-        print('Reloaded {package_path}')
+        import sys
+        if {incremental} and '{agent_name}' in sys.modules:
+            sys.modules['{agent_name}'].reload_modules('{package_path}')
+        else:
+            import {package_path}
+            importlib.reload({package_path})
+            print('Reloaded {package_path}')
         '''),
 }
 
 SCRATCH_BUFFER = None
 
-
-@dataclass
-class CodeBuffer:
-    syntax: str
-    code: str
+REMOTE_HOST = '127.0.0.1'
+CONNECT_TIMEOUT = 1.0
+# Default for how long to wait for the remote to acknowledge a command,
+# which includes waiting for anything it is still running from a previous
+# send.
+REPLY_TIMEOUT = 60.0
+RECONNECT_BACKOFF_MIN = 0.25
+RECONNECT_BACKOFF_MAX = 8.0
+
+# (app, host, port) -> RemoteTarget
+_TARGETS = {}
+_TARGETS_LOCK = threading.Lock()
+
+RECEIVER_NAME = f'{THIS_MODULE_NAME}_receiver'
+AGENT_NAME = f'{THIS_MODULE_NAME}_agent'
+AGENT_PATH = os.path.join(os.path.dirname(__file__), 'remote', f'{AGENT_NAME}.py')
+# Number of requests the agent keeps compiled, per Sublime session.
+AGENT_CACHE_SIZE = 64
+_AGENT_SOURCE = None
+# Maya's default commandPort bufferSize.  Commands bigger than this get
+# truncated by the command port.
+DEFAULT_FRAME_SIZE = 4096
+# Worst case size of everything but the data in a FRAME_TEMPLATE command.
+FRAME_OVERHEAD = 256
+
+OUTPUT_PANEL_NAME = THIS_MODULE_NAME
+# Output from the remotes is written to the panel at most this often, and
+# at most OUTPUT_BATCH_SIZE characters at a time, so a remote printing in a
+# loop can't monopolize the UI thread.
+OUTPUT_FLUSH_INTERVAL = 50
+OUTPUT_BATCH_SIZE = 64 * 1024
+# Characters of output allowed to wait for the panel; the oldest are
+# dropped beyond this.
+OUTPUT_PENDING_LIMIT = 1024 * 1024
+# Characters kept in the panel; the oldest lines are trimmed beyond this.
+OUTPUT_PANEL_LIMIT = 2 * 1024 * 1024
+# Longest message accepted from an output channel, in bytes.  The agent
+# never sends more than 64K characters at a time (_OutputChannel.MAX_MESSAGE),
+# which is at most 4 bytes each in utf-8.
+OUTPUT_MESSAGE_LIMIT = 256 * 1024 + 1024
+
+# local host -> OutputServer
+_OUTPUT_SERVERS = {}
+
+# (view id, app, group) -> {definition key: source} of what exec_changed
+# has sent successfully, for the most recently used views.
+_SENT_DEFINITIONS = collections.OrderedDict()
+SENT_DEFINITIONS_VIEWS = 64
+# (view id, app, group) -> {request id: {definition key: source}} of the
+# exec_changed requests that haven't finished yet, oldest first.
+_PENDING_DEFINITIONS = {}
+
+# Number of most recent samples percentiles are computed from, per
+# command, target and stage.
+LATENCY_WINDOW = 1000
+_ACTIVE_TRACE = None
+
+# How long a directory's cached package status is trusted before its mtime
+# is checked again.
+PACKAGE_INDEX_TTL = 5.0
+
+_SESSION_ID = os.urandom(4).hex()
+_REQUEST_COUNTER = itertools.count(1)
+
+
+CodeBuffer = collections.namedtuple('CodeBuffer', 'syntax code')
+
+QueuedJob = collections.namedtuple('QueuedJob', 'job future key digest')
+
+
+class TargetConfig(collections.namedtuple('TargetConfig', 'app host port protocol wire frame_size timeout')):
+    __slots__ = ()
+
+    def __str__(self):
+        return f'{self.host}:{self.port}'
 
 
 def error(msg):
@@ -112,11 +276,63 @@ def get_setting(key, default_value):
     return settings.get(key, default_value)
 
 
+def next_request_id():
+    return f'{_SESSION_ID}.{next(_REQUEST_COUNTER)}'
+
+
+def get_agent_source():
+    global _AGENT_SOURCE
+    if _AGENT_SOURCE is None:
+        with open(AGENT_PATH, encoding='utf-8') as fp:
+            _AGENT_SOURCE = fp.read()
+    return _AGENT_SOURCE
+
+
 def get_syntax(view):
     syntax = view.syntax()
     return syntax.name.lower()
 
 
+class PackageIndex:
+    """Remembers which directories are Python packages.
+
+    Directories are looked up lazily.  A cached answer is trusted for
+    PACKAGE_INDEX_TTL seconds, after which the directory's mtime is checked
+    (adding or removing an __init__.py changes it) and __init__.py is only
+    looked for again if the mtime changed.  Stats can be slow on network
+    mounts, so how many were avoided is counted.
+    """
+
+    def __init__(self):
+        # dir_path -> (is_package, dir_mtime, checked_time)
+        self.dirs = {}
+        self.stats_made = 0
+        self.stats_saved = 0
+
+    def is_package(self, dir_path):
+        now = time.monotonic()
+        entry = self.dirs.get(dir_path)
+        if entry and now - entry[2] < PACKAGE_INDEX_TTL:
+            self.stats_saved += 1
+            return entry[0]
+
+        try:
+            mtime = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            mtime = None
+        self.stats_made += 1
+        if entry and mtime is not None and entry[1] == mtime:
+            is_package = entry[0]
+        else:
+            is_package = os.path.isfile(os.path.join(dir_path, '__init__.py'))
+            self.stats_made += 1
+        self.dirs[dir_path] = (is_package, mtime, now)
+        return is_package
+
+
+_PACKAGE_INDEX = PackageIndex()
+
+
 def find_module_package_path(file_path):
     dir_path, file_name = os.path.split(file_path)
     module_name, _ = os.path.splitext(file_name)
@@ -124,8 +340,7 @@ def find_module_package_path(file_path):
     if module_name != "__init__":
         package_path_parts.append(module_name)
     while True:
-        init_path = os.path.join(dir_path, '__init__.py')
-        if os.path.isfile(init_path):
+        if _PACKAGE_INDEX.is_package(dir_path):
             dir_path, dir_name = os.path.split(dir_path)
             package_path_parts.append(dir_name)
         else:
@@ -134,57 +349,755 @@ def find_module_package_path(file_path):
     return package_path
 
 
-def send_code_to_remote(port, code_buffer, exec_template):
+class RequestTrace:
+    """Times the stages of one request to one target.  Stages are measured
+    from the end of the previous one."""
+
+    def __init__(self, command, request_id=None, view_id=None, coalesce=False):
+        self.command = command
+        self.view_id = view_id
+        # Whether a newer request from the same command and view replaces
+        # this one while it's still queued.
+        self.coalesce = coalesce
+        self.request_id = request_id or next_request_id()
+        self.stages = {}
+        self.start_time = self.last_time = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last_time
+        self.last_time = now
+
+    def fork(self):
+        trace = RequestTrace(self.command, self.request_id, self.view_id, self.coalesce)
+        trace.stages = dict(self.stages)
+        trace.start_time = self.start_time
+        trace.last_time = self.last_time
+        return trace
+
+    def total(self):
+        return self.last_time - self.start_time
+
+
+@contextlib.contextmanager
+def trace_request(command, view=None, coalesce=False):
+    # Commands run on the UI thread one at a time, so the trace of the
+    # running command is just a global that send_code_to_remote picks up.
+    global _ACTIVE_TRACE
+    _ACTIVE_TRACE = RequestTrace(command, view_id=view.id() if view else None, coalesce=coalesce)
+    try:
+        yield _ACTIVE_TRACE
+    finally:
+        _ACTIVE_TRACE = None
+
+
+def mark_stage(stage):
+    if _ACTIVE_TRACE:
+        _ACTIVE_TRACE.mark(stage)
+
+
+def percentile(sorted_values, fraction):
+    # Nearest rank: the smallest value at least fraction of the values are
+    # less than or equal to.
+    index = max(0, math.ceil(fraction * len(sorted_values)) - 1)
+    return sorted_values[min(index, len(sorted_values) - 1)]
+
+
+class LatencyStats:
+    """Rolling window of stage times per command, target and stage.
+
+    Client stages are recorded as requests finish.  Remote stages arrive
+    separately through the output channel and are matched to their command
+    by request id.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # (command, target, stage) -> deque of seconds
+        self.samples = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+        # request id -> command, for recent requests
+        self.commands = collections.OrderedDict()
+
+    def record(self, trace, target):
+        with self.lock:
+            self.commands[trace.request_id] = trace.command
+            while len(self.commands) > LATENCY_WINDOW:
+                self.commands.popitem(last=False)
+            for stage, seconds in trace.stages.items():
+                self.samples[(trace.command, target, stage)].append(seconds)
+            self.samples[(trace.command, target, 'total')].append(trace.total())
+
+    def record_remote(self, request_id, target, stages):
+        with self.lock:
+            command = self.commands.get(request_id, 'unknown')
+            for stage, seconds in stages.items():
+                self.samples[(command, target, f'remote_{stage}')].append(seconds)
+
+    def reset(self):
+        with self.lock:
+            self.samples.clear()
+            self.commands.clear()
+
+    def summary(self):
+        with self.lock:
+            items = [(key, sorted(values)) for key, values in self.samples.items() if values]
+        rows = []
+        for (command, target, stage), values in sorted(items):
+            rows.append({
+                'command': command,
+                'target': target,
+                'stage': stage,
+                'count': len(values),
+                'p50_ms': percentile(values, 0.50) * 1000,
+                'p95_ms': percentile(values, 0.95) * 1000,
+                'p99_ms': percentile(values, 0.99) * 1000,
+                'max_ms': values[-1] * 1000,
+            })
+        return rows
+
+
+_LATENCY_STATS = LatencyStats()
+
+
+class OutputPanel(ViewAppender):
+    """Appends output from the remotes to the output panel of the active
+    window, headed by the remote it came from."""
+
+    def __init__(self):
+        super().__init__(OUTPUT_BATCH_SIZE, OUTPUT_PENDING_LIMIT, OUTPUT_PANEL_LIMIT, OUTPUT_FLUSH_INTERVAL)
+
+    def format_dropped(self, count):
+        return f'\n[{THIS_MODULE_NAME}: {count} characters of output dropped]\n'
+
+    def get_view(self):
+        window = sublime.active_window()
+        if not window:
+            return None
+        panel = window.find_output_panel(OUTPUT_PANEL_NAME)
+        if panel is None:
+            panel = window.create_output_panel(OUTPUT_PANEL_NAME)
+        if window.active_panel() != f'output.{OUTPUT_PANEL_NAME}':
+            window.run_command('show_panel', {'panel': f'output.{OUTPUT_PANEL_NAME}'})
+        return panel
+
+
+_OUTPUT_PANEL = OutputPanel()
+
+
+class OutputServer:
+    """Accepts the connections agents make back to Sublime to stream the
+    output of the code they run (see _OutputChannel in the agent).
+    """
+
+    def __init__(self, host):
+        import socket
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.bind((host, 0))
+        self.sock.listen()
+        self.address = self.sock.getsockname()
+        threading.Thread(target=self._accept, name=f'{THIS_MODULE_NAME} output', daemon=True).start()
+
+    def close(self):
+        self.sock.close()
+
+    def _accept(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._read, args=(conn,), name=f'{THIS_MODULE_NAME} output', daemon=True).start()
+
+    def _read(self, conn):
+        import struct
+        label = '{}:{}'.format(*conn.getpeername())
+        try:
+            while True:
+                header = self._recv_exactly(conn, 5)
+                if not header:
+                    break
+                kind, length = struct.unpack('!cI', header)
+                if length > OUTPUT_MESSAGE_LIMIT:
+                    raise ValueError(f'{label} sent a {length} byte message')
+                text = self._recv_exactly(conn, length).decode('utf-8', 'replace')
+                if kind == b'h':
+                    label = text
+                elif kind == b't':
+                    timings = json.loads(text)
+                    _LATENCY_STATS.record_remote(timings['request_id'], label, timings['stages'])
+                elif kind == b'm':
+                    forget_known_digests(label)
+                else:
+                    _OUTPUT_PANEL.write(text, label)
+        except (OSError, struct.error, ValueError, KeyError):
+            pass
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _recv_exactly(conn, size):
+        data = bytearray()
+        while len(data) < size:
+            chunk = conn.recv(size - len(data))
+            if not chunk:
+                if data:
+                    raise ConnectionResetError('Output connection closed mid-message')
+                return b''
+            data += chunk
+        return bytes(data)
+
+
+def forget_known_digests(label):
+    # The agent lost (part of) its cache for this session, e.g. another
+    # version of exec_remote reinstalled it.  Cleared on the target's
+    # worker, which is the only thread that touches known_digests.
+    with _TARGETS_LOCK:
+        targets = [target for target in _TARGETS.values() if str(target.connection) == label]
+    for target in targets:
+        target.submit(lambda connection: connection.known_digests.clear())
+
+
+def get_output_server(host):
+    # Listen on the interface the remote was reached through, so it can
+    # connect back without the server being exposed anywhere else.
+    with _TARGETS_LOCK:
+        server = _OUTPUT_SERVERS.get(host)
+        if server is None:
+            server = OutputServer(host)
+            _OUTPUT_SERVERS[host] = server
+        return server
+
+
+class RemoteUnavailable(ConnectionError):
+    pass
+
+
+class RemoteConnection:
+    """A persistent socket to a single remote command port.
+
+    The socket is opened lazily and kept open between sends.  If the remote
+    goes away (e.g. Maya or Blender was restarted), the next send reconnects,
+    and failed connection attempts back off exponentially so a closed port
+    isn't hammered on every keypress.
+
+    If track_replies is set, the remote is expected to answer every command
+    with a nul terminated reply, which lets sends wait for earlier commands
+    to finish, for at most reply_timeout seconds.  on_connect is called with
+    the connection every time a new socket is opened, before anything else
+    is sent.  With length_prefixed set, every command is preceded by its
+    length as four big endian bytes, for remotes that need to be told where
+    commands end (see remote/exec_remote_blender.py).
+    """
+
+    def __init__(self, address, on_connect=None, track_replies=False, reply_timeout=REPLY_TIMEOUT,
+                 length_prefixed=False):
+        self.address = address
+        self.length_prefixed = length_prefixed
+        self.on_connect = on_connect
+        self.track_replies = track_replies
+        self.reply_timeout = reply_timeout
+        self.sock = None
+        self.pending_replies = 0
+        # Digests of requests the remote agent has cached, oldest first.
+        # Only valid for the life of the socket, and only relied on while
+        # the agent can report a miss (see install_agent).
+        self.known_digests = collections.OrderedDict()
+        self.reports_misses = False
+        self.backoff = 0.0
+        self.next_connect_time = 0.0
+
+    def connect(self):
+        import socket
+        if self.sock:
+            return self.sock
+
+        now = time.monotonic()
+        if now < self.next_connect_time:
+            wait = self.next_connect_time - now
+            raise RemoteUnavailable(f'{self} unavailable, retrying in {wait:.1f}s')
+
+        try:
+            sock = socket.create_connection(self.address, CONNECT_TIMEOUT)
+        except OSError:
+            self.backoff = min(max(self.backoff * 2, RECONNECT_BACKOFF_MIN), RECONNECT_BACKOFF_MAX)
+            self.next_connect_time = now + self.backoff
+            raise
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.pending_replies = 0
+        self.known_digests.clear()
+        self.reports_misses = False
+        self.backoff = 0.0
+        self.next_connect_time = 0.0
+        if self.on_connect:
+            try:
+                self.on_connect(self)
+            except Exception:
+                self.close()
+                raise
+        return sock
+
+    def close(self):
+        if self.sock:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def read_replies(self, block):
+        # The command port answers every command it runs.  Nobody is
+        # interested in the replies, but they have to be read so they don't
+        # back up and stall the remote end.  Also notices a connection the
+        # remote has closed since the last send.
+        if block:
+            self.sock.settimeout(self.reply_timeout)
+        else:
+            self.sock.setblocking(False)
+        try:
+            while not block or self.pending_replies:
+                data = self.sock.recv(65536)
+                if not data:
+                    raise ConnectionResetError(f'{self} closed the connection')
+                if self.track_replies:
+                    self.pending_replies = max(0, self.pending_replies - data.count(b'\0'))
+        except BlockingIOError:
+            pass
+        finally:
+            if self.sock:
+                self.sock.settimeout(CONNECT_TIMEOUT)
+
+    def ensure_connected(self):
+        # A warm socket may have been closed by the remote since it was last
+        # used, so retry once on a fresh connection before giving up.
+        for attempt in range(2):
+            self.connect()
+            try:
+                self.read_replies(block=False)
+                return
+            except OSError:
+                self.close()
+                if attempt:
+                    raise
+
+    def send(self, data, sync=False):
+        self.ensure_connected()
+        try:
+            if sync:
+                self.read_replies(block=True)
+            self._sendall(data)
+        except OSError:
+            self.close()
+            raise
+
+    def _sendall(self, data):
+        if self.length_prefixed:
+            import struct
+            data = struct.pack('!I', len(data)) + data
+        self.sock.sendall(data)
+        if self.track_replies:
+            self.pending_replies += 1
+
+    def __str__(self):
+        return '{}:{}'.format(*self.address)
+
+
+class RemoteTarget:
+    """Serializes all sends to one remote on a background worker thread.
+
+    Sending never happens on Sublime's UI thread, so a remote that is busy
+    (or hung) can't freeze the editor.
+    """
+
+    def __init__(self, config):
+        address = (config.host, config.port)
+        length_prefixed = config.wire == 'length_prefixed'
+        if config.protocol == 'framed':
+            on_connect = lambda connection: install_agent(connection, config.frame_size)
+            self.connection = RemoteConnection(
+                address, on_connect, track_replies=True, reply_timeout=config.timeout,
+                length_prefixed=length_prefixed)
+        else:
+            # Maya's command port answers these too, and counting the
+            # replies lets a send wait for the code to finish running.
+            self.connection = RemoteConnection(
+                address, track_replies=True, reply_timeout=config.timeout, length_prefixed=length_prefixed)
+        self.config = config
+        self.condition = threading.Condition()
+        # QueuedJobs not started yet, None to stop the worker.
+        self.pending = collections.deque()
+        self.thread = threading.Thread(
+            target=self._run, name=f'{THIS_MODULE_NAME} {self.connection}', daemon=True)
+        self.thread.start()
+
+    def submit(self, job, key=None, digest=None):
+        """Queues job(connection) to be run.
+
+        Returns (future, queued), where the Future is for the job's run time
+        in seconds.  If a job for the same digest is already waiting, job is
+        dropped and that job's future is returned with queued False.  Jobs
+        still waiting with the same key are cancelled, as job supersedes
+        them.
+        """
+        import concurrent.futures
+        with self.condition:
+            if digest:
+                for queued_job in self.pending:
+                    if queued_job and queued_job.digest == digest:
+                        return queued_job.future, False
+            if key:
+                for queued_job in list(self.pending):
+                    if queued_job and queued_job.key == key:
+                        queued_job.future.cancel()
+                        self.pending.remove(queued_job)
+            future = concurrent.futures.Future()
+            self.pending.append(QueuedJob(job, future, key, digest))
+            self.condition.notify()
+        return future, True
+
+    def cancel_pending(self):
+        with self.condition:
+            cancelled = [queued_job for queued_job in self.pending if queued_job]
+            for queued_job in cancelled:
+                queued_job.future.cancel()
+            self.pending = collections.deque(queued_job for queued_job in self.pending if not queued_job)
+        return len(cancelled)
+
+    def shutdown(self):
+        with self.condition:
+            self.pending.append(None)
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                queued_job = self.pending.popleft()
+            if queued_job is None:
+                break
+            future = queued_job.future
+            if not future.set_running_or_notify_cancel():
+                continue
+            start_time = time.perf_counter()
+            try:
+                queued_job.job(self.connection)
+            except Exception as ex:
+                future.set_exception(ex)
+            else:
+                future.set_result(time.perf_counter() - start_time)
+        self.connection.close()
+
+
+def get_target(config):
+    key = (config.app, config.host, config.port)
+    with _TARGETS_LOCK:
+        target = _TARGETS.get(key)
+        if target is not None and target.config != config:
+            # The settings changed (e.g. the protocol or timeout).  The old
+            # target finishes what's already queued and closes its
+            # connection.
+            target.shutdown()
+            target = None
+        if target is None:
+            target = RemoteTarget(config)
+            _TARGETS[key] = target
+        return target
+
+
+def plugin_unloaded():
+    with _TARGETS_LOCK:
+        for target in _TARGETS.values():
+            target.shutdown()
+        _TARGETS.clear()
+        for server in _OUTPUT_SERVERS.values():
+            server.close()
+        _OUTPUT_SERVERS.clear()
+
+
+def parse_address(address):
+    # "host:port", or just a port on REMOTE_HOST.
+    if isinstance(address, int):
+        return REMOTE_HOST, address
+    host, _, port = str(address).rpartition(':')
+    try:
+        return host or REMOTE_HOST, int(port)
+    except ValueError:
+        raise ValueError(f'Bad target address "{address}", expected "host:port".')
+
+
+def get_target_configs(app, group=None):
+    protocol = get_setting(f'{app}_protocol', 'file')
+    if protocol not in ('framed', 'file'):
+        raise ValueError(f'Unknown {app}_protocol "{protocol}", expected "framed" or "file".')
+    wire = get_setting(f'{app}_wire', 'raw')
+    if wire not in ('raw', 'length_prefixed'):
+        raise ValueError(f'Unknown {app}_wire "{wire}", expected "raw" or "length_prefixed".')
+    frame_size = get_setting(f'{app}_frame_size', None) or get_setting('frame_size', DEFAULT_FRAME_SIZE)
+    timeout = get_setting('target_timeout', REPLY_TIMEOUT)
+
+    group = group or get_setting(f'{app}_group', None)
+    if group:
+        addresses = get_setting(f'{app}_groups', {}).get(group)
+        if not addresses:
+            raise ValueError(f'No "{group}" group in {app}_groups in {THIS_MODULE_NAME}.sublime-settings.')
+    else:
+        port = get_setting(f'{app}_port', None)
+        if port is None:
+            raise ValueError(f'No {app}_port set in {THIS_MODULE_NAME}.sublime-settings.')
+        addresses = [port]
+
+    configs = []
+    for address in addresses:
+        host, port = parse_address(address)
+        configs.append(TargetConfig(app, host, port, protocol, wire, frame_size, timeout))
+    return configs
+
+
+def send_code_to_remote(app, code_buffer, group=None, wait=None):
+    """Queues code_buffer to be run on every target in group.
+
+    Returns a dict of TargetConfig to the Future for each queued send, or
+    None if nothing was queued.  If wait is set, each future only completes
+    once the remote has finished running the code.
+    """
+    try:
+        configs = get_target_configs(app, group)
+    except ValueError as ex:
+        error(str(ex))
+        return None
+
+    # Every target has its own worker, so the sends all run concurrently
+    # and a hung target only holds up its own queue.  With more than one
+    # target, each job waits for the remote to finish running the code so
+    # the summary says how it went.
+    if wait is None:
+        wait = len(configs) > 1
+    trace = _ACTIVE_TRACE or RequestTrace('send')
+    # A newer request from the same command and view replaces one that's
+    # still queued if the command says it can (e.g. an exec of the whole
+    # buffer), and a request for code that's already queued is dropped.
+    key = (trace.command, trace.view_id) if trace.coalesce and trace.view_id is not None else None
+    digest = code_digest(code_buffer)
+    futures = {}
+    num_dropped = 0
+    for config in configs:
+        if config.protocol == 'framed':
+            job = functools.partial(
+                send_code_framed, code_buffer=code_buffer, digest=digest, frame_size=config.frame_size,
+                wait=wait, trace=trace.fork())
+        else:
+            job = functools.partial(
+                send_code_with_file, code_buffer=code_buffer, exec_template=EXEC_CODE_TEMPLATES[app],
+                wait=wait, trace=trace.fork())
+        future, queued = get_target(config).submit(job, key, digest)
+        futures[config] = future
+        if not queued:
+            num_dropped += 1
+    if num_dropped == len(futures):
+        sublime.status_message(f'{THIS_MODULE_NAME}: same code already queued')
+        return None
+
+    if len(futures) == 1:
+        (config, future), = futures.items()
+        future.add_done_callback(lambda future: report_result(config, future))
+    else:
+        timeout = max(config.timeout for config in futures)
+        threading.Thread(
+            target=report_group_results, args=(app, group, dict(futures), timeout), daemon=True).start()
+    return futures
+
+
+def cancel_queued(app=None):
+    with _TARGETS_LOCK:
+        targets = list(_TARGETS.values())
+    return sum(target.cancel_pending() for target in targets if app in (None, target.config.app))
+
+
+def report_result(config, future):
+    if future.cancelled():
+        sublime.set_timeout(lambda: sublime.status_message(
+            f'{THIS_MODULE_NAME}: queued request to {config} cancelled'))
+        return
+    ex = future.exception()
+    if ex is None:
+        return
+    if isinstance(ex, RemoteUnavailable):
+        sublime.set_timeout(lambda: sublime.status_message(f'{THIS_MODULE_NAME}: {ex}'))
+    else:
+        sublime.set_timeout(lambda: error(
+            f"Error sending to remote:\n\n{ex}\n\nSee Sublime console for details."))
+        print(f'{THIS_MODULE_NAME}: error sending to {config}: {ex!r}')
+
+
+def report_group_results(app, group, futures, timeout):
+    import concurrent.futures
+    concurrent.futures.wait(futures.values(), timeout)
+    lines = []
+    num_ok = 0
+    for config, future in futures.items():
+        if future.cancelled():
+            result = 'cancelled'
+        elif not future.done():
+            result = f'timed out after {timeout:g}s'
+        elif future.exception():
+            result = f'failed: {future.exception()}'
+        else:
+            result = f'ok ({future.result() * 1000:.0f} ms)'
+            num_ok += 1
+        lines.append(f'  {config}: {result}')
+    summary = f'{num_ok} of {len(futures)} {app} targets ok'
+    print(f'{THIS_MODULE_NAME}: {summary}' + (f' in group "{group}"' if group else '') + ':')
+    print('\n'.join(lines))
+    sublime.set_timeout(lambda: sublime.status_message(f'{THIS_MODULE_NAME}: {summary}'))
+
+
+def send_command(connection, command, frame_size):
+    command_bytes = command.encode(encoding='utf-8')
+    if len(command_bytes) > frame_size:
+        raise ValueError(f'frame_size {frame_size} is too small, need at least {len(command_bytes)} bytes.')
+    connection.send(command_bytes, sync=True)
+
+
+def send_frames(connection, request_id, data, frame_size):
+    # Streams data as base64 chunks, each one its own command small enough
+    # for the command port, so there's no limit on the size of data.
+    # Frames are sent in lockstep with the replies so the command port
+    # never sees two of them run together.
+    import base64
+    chunk_size = max(1, (frame_size - FRAME_OVERHEAD) // 4 * 3)
+    for offset in range(0, len(data), chunk_size):
+        chunk = base64.b64encode(data[offset:offset + chunk_size]).decode('ascii')
+        command = FRAME_TEMPLATE.format(
+            receiver_name=RECEIVER_NAME,
+            request_id=request_id,
+            offset=offset,
+            length=len(data),
+            data=chunk,
+        )
+        connection.send(command.encode(encoding='utf-8'), sync=True)
+
+
+def install_agent(connection, frame_size):
+    import hashlib
+    command = RECEIVER_INSTALL_TEMPLATE.format(
+        receiver_name=RECEIVER_NAME,
+        receiver_source=RECEIVER_SOURCE,
+    )
+    send_command(connection, command, frame_size)
+
+    source = get_agent_source()
+    request_id = next_request_id()
+    send_frames(connection, request_id, source.encode(encoding='utf-8'), frame_size)
+    command = AGENT_INSTALL_TEMPLATE.format(
+        agent_name=AGENT_NAME,
+        receiver_name=RECEIVER_NAME,
+        request_id=request_id,
+        version=hashlib.sha1(source.encode(encoding='utf-8')).hexdigest()[:12],
+        cache_size=AGENT_CACHE_SIZE,
+        mel_rehash=get_setting('mel_rehash', 'auto'),
+    )
+    send_command(connection, command, frame_size)
+
+    if get_setting('output_panel', True):
+        host, port = get_output_server(connection.sock.getsockname()[0]).address
+        command = AGENT_ATTACH_OUTPUT_TEMPLATE.format(
+            agent_name=AGENT_NAME,
+            session_id=_SESSION_ID,
+            host=host,
+            port=port,
+            label=connection,
+        )
+        send_command(connection, command, frame_size)
+        # The agent drops caches of sessions without a live output channel,
+        # and reports misses through it.
+        connection.reports_misses = True
+
+
+def code_digest(code_buffer):
+    import hashlib
+    data = code_buffer.syntax.encode(encoding='utf-8') + b'\0' + code_buffer.code.encode(encoding='utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+def send_code_framed(connection, code_buffer, digest, frame_size, trace, wait=False):
+    # The agent caches compiled code by digest, so code it has already seen
+    # (e.g. the scratch buffer) is sent as just the digest.  known_digests
+    # mirrors the agent's LRU cache for this session.
+    trace.mark('queue')
+    code_bytes = code_buffer.code.encode(encoding='utf-8')
+    connection.ensure_connected()
+    trace.mark('connect')
+    known_digests = connection.known_digests
+    sent = not connection.reports_misses or digest not in known_digests
+    if sent:
+        send_frames(connection, trace.request_id, code_bytes, frame_size)
+    known_digests[digest] = True
+    known_digests.move_to_end(digest)
+    while len(known_digests) > AGENT_CACHE_SIZE:
+        known_digests.popitem(last=False)
+    trace.mark('transfer')
+
+    command = AGENT_EXEC_TEMPLATE.format(
+        agent_name=AGENT_NAME,
+        session_id=_SESSION_ID,
+        request_id=trace.request_id,
+        digest=digest,
+        syntax=code_buffer.syntax,
+        sent=sent,
+    )
+    send_command(connection, command, frame_size)
+    trace.mark('send')
+    if wait:
+        connection.read_replies(block=True)
+        trace.mark('remote')
+    _LATENCY_STATS.record(trace, str(connection))
+
+
+def send_code_with_file(connection, code_buffer, exec_template, trace, wait=False):
+    trace.mark('queue')
     # Always use a file on disk so the command port buffer doesn't have to
     # be huge, we don't have to worry about escaping all quotes, etc.
+    import tempfile
     file_no, code_filepath = tempfile.mkstemp(prefix=f'{THIS_MODULE_NAME}_temp_', suffix='.txt')
     try:
         os.write(file_no, code_buffer.code.encode(encoding='utf-8'))
     finally:
         os.close(file_no)
+    trace.mark('write_file')
 
     code_filepath = escape_filepath(code_filepath)
     command = exec_template.format(
         this_module_name=THIS_MODULE_NAME,
         syntax=code_buffer.syntax,
         code_filepath=code_filepath,
+        mel_rehash='rehash; ' if get_setting('mel_rehash', 'auto') == 'always' else '',
     )
 
     try:
         command_bytes = command.encode(encoding='utf-8')
         if len(command_bytes) > 4096:
-            error("Command too large, and I'm too lazy to handle this case right now.")
-            return
-
-        sock = None
-        try:
-            address = ('127.0.0.1', port)
-            sock = socket.create_connection(address, 1.0)
-            sock.sendall(command_bytes)
-        except Exception as ex:
-            error(f"Error sending to remote:\n\n{ex}\n\nSee Sublime console for details.")
-            raise
-        finally:
-            if sock:
-                sock.close()
+            raise ValueError("Command too large, and I'm too lazy to handle this case right now.")
+        connection.send(command_bytes)
     except:
         try:
             os.remove(code_filepath)
         except:
             pass
         raise
+    trace.mark('send')
+    if wait:
+        connection.read_replies(block=True)
+        trace.mark('remote')
+    _LATENCY_STATS.record(trace, str(connection))
 
 
-def send_code_to_maya(code_buffer):
-    port = get_setting('maya_port', None)
-    template = EXEC_CODE_TEMPLATES['maya']
-    send_code_to_remote(port, code_buffer, template)
+def send_code_to_maya(code_buffer, group=None):
+    return send_code_to_remote('maya', code_buffer, group)
 
 
-def send_code_to_blender(code_buffer):
-    port = get_setting('blender_port', None)
-    template = EXEC_CODE_TEMPLATES['blender']
-    send_code_to_remote(port, code_buffer, template)
+def send_code_to_blender(code_buffer, group=None):
+    return send_code_to_remote('blender', code_buffer, group)
 
 
 def get_current_code(view):
@@ -200,29 +1113,140 @@ def get_current_code(view):
         # correct Python, and preserve original line numbers to make
         # any reported errors easier to find.  Having multiple
         # regions selected on a single line will lead to odd (and
-        # likely invalid) results.
-        chunk = ''
-        for region_line in view.split_by_newlines(eval_region):
-            lineno = view.rowcol(region_line.begin())[0]
-            padding = lineno - lines_written
-            for ii in range(padding - 1):
-                chunks.append('\n')
-            lines_written = lineno
-            chunk += view.substr(region_line) + '\n'
-        chunks.append(textwrap.dedent(chunk))
+        # likely invalid) results.  Only one rowcol() and substr() per
+        # region, so this stays linear in buffer size and region count.
+        lineno = view.rowcol(eval_region.begin())[0]
+        padding = lineno - lines_written - 1
+        if padding > 0:
+            chunks.append('\n' * padding)
+        chunk = view.substr(eval_region)
+        lines_written = lineno + chunk.count('\n')
+        chunks.append(textwrap.dedent(chunk + '\n'))
     return ''.join(chunks)
 
 
 def exec_current(view, send_code_func):
+    # Only an exec of the whole buffer is sure to be superseded by the next
+    # one; different selections are different code.
+    whole_buffer = all(r.empty() for r in view.sel())
+    with trace_request('exec', view, coalesce=whole_buffer):
+        syntax = get_syntax(view)
+        code = get_current_code(view)
+        mark_stage('get_code')
+        send_code_func(CodeBuffer(syntax, code))
+
+
+def get_top_level_definitions(source):
+    """Splits Python source into its top level statements.
+
+    Returns a list of (key, first_line, last_line) with 0 based, inclusive
+    line numbers.  Functions and classes are keyed by name and simple
+    assignments by target names, so edits to them are seen as changes to
+    the same definition.  Any other statement is keyed by its text.
+    Statements sharing a line (e.g. with ;) are merged.
+    """
+    import ast
+    lines = source.split('\n')
+    units = []
+    for node in ast.parse(source).body:
+        first_line = min([node.lineno] + [d.lineno for d in getattr(node, 'decorator_list', [])]) - 1
+        last_line = node.end_lineno - 1
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            key = ('def', node.name)
+        elif isinstance(node, ast.Assign) and all(isinstance(t, ast.Name) for t in node.targets):
+            key = ('assign', tuple(t.id for t in node.targets))
+        elif isinstance(node, (ast.AnnAssign, ast.AugAssign)) and isinstance(node.target, ast.Name):
+            key = ('assign', (node.target.id,))
+        else:
+            key = None
+        if units and first_line <= units[-1][2]:
+            _, prev_first_line, prev_last_line = units[-1]
+            units[-1] = (None, prev_first_line, max(last_line, prev_last_line))
+        else:
+            units.append((key, first_line, last_line))
+
+    definitions = []
+    for key, first_line, last_line in units:
+        text = '\n'.join(lines[first_line:last_line + 1])
+        definitions.append((key or ('stmt', text), first_line, last_line, text))
+    return definitions
+
+
+def exec_changed(view, send_code_func, destination):
+    """Sends only the top level definitions of the whole buffer that
+    changed since the last time it was sent this way to destination, at
+    their original line numbers."""
     syntax = get_syntax(view)
-    code = get_current_code(view)
-    send_code_func(CodeBuffer(syntax, code))
+    if syntax != 'python' or any(not r.empty() for r in view.sel()):
+        return exec_current(view, send_code_func)
+
+    with trace_request('exec_changed', view) as trace:
+        source = view.substr(sublime.Region(0, view.size()))
+        try:
+            definitions = get_top_level_definitions(source)
+        except SyntaxError:
+            # Let the remote report it.
+            return send_code_func(CodeBuffer(syntax, source))
+
+        # Definitions in requests still in flight count as sent.  If one of
+        # those fails, its definitions are sent again next time.
+        state_key = (view.id(),) + tuple(destination)
+        sent = dict(_SENT_DEFINITIONS.get(state_key, {}))
+        for pending in _PENDING_DEFINITIONS.get(state_key, {}).values():
+            sent.update(pending)
+        changed = {}
+        chunks = []
+        lines_written = -1
+        for key, first_line, last_line, text in definitions:
+            if sent.get(key) == text:
+                continue
+            changed[key] = text
+            chunks.append('\n' * (first_line - lines_written - 1))
+            chunks.append(text + '\n')
+            lines_written = last_line
+        mark_stage('get_code')
+
+        if not chunks:
+            return sublime.status_message(f'{THIS_MODULE_NAME}: no changed definitions')
+        futures = send_code_func(CodeBuffer(syntax, ''.join(chunks)))
+        if not futures:
+            return
+        request_id = trace.request_id
+        _PENDING_DEFINITIONS.setdefault(state_key, {})[request_id] = changed
+        keys = {key for key, _, _, _ in definitions}
+        for future in futures.values():
+            future.add_done_callback(lambda future: sublime.set_timeout(
+                lambda: commit_sent_definitions(state_key, request_id, keys, futures)))
+
+
+def commit_sent_definitions(state_key, request_id, keys, futures):
+    """Counts the definitions exec_changed sent in request_id as sent, once
+    it has gone to every target without errors.  keys are the definitions
+    in the buffer when it was sent; any others are forgotten."""
+    if not all(future.done() for future in futures.values()):
+        return
+    pending = _PENDING_DEFINITIONS.get(state_key, {})
+    changed = pending.pop(request_id, None)
+    if not pending:
+        _PENDING_DEFINITIONS.pop(state_key, None)
+    if changed is None:
+        return
+    if any(future.cancelled() or future.exception() for future in futures.values()):
+        return
+
+    sent = _SENT_DEFINITIONS.pop(state_key, {})
+    sent = {key: text for key, text in sent.items() if key in keys}
+    sent.update(changed)
+    _SENT_DEFINITIONS[state_key] = sent
+    while len(_SENT_DEFINITIONS) > SENT_DEFINITIONS_VIEWS:
+        _SENT_DEFINITIONS.popitem(last=False)
 
 
 def exec_scratch_buffer(view, send_code_func):
     if not SCRATCH_BUFFER:
         return error('No buffer saved, use the save_exec_scratch_buffer command.')
-    send_code_func(SCRATCH_BUFFER)
+    with trace_request('exec_scratch_buffer', view):
+        send_code_func(SCRATCH_BUFFER)
 
 
 def print_selected_values(view, send_code_func):
@@ -231,17 +1255,24 @@ def print_selected_values(view, send_code_func):
     if not template:
         return error(f'No print template for current syntax ({syntax}).')
 
-    regions = [r for r in view.sel() if not r.empty()]
-    for region in regions:
+    exprs = []
+    for region in view.sel():
+        if region.empty():
+            continue
         expr = view.substr(region)
         expr = expr.strip()
         if not expr:
             continue
         if '\n' in expr:
             continue
-        expr = expr.replace('\\', '\\\\')
-        expr = expr.replace('"', '\\"')
-        code = template.format(expr=expr)
+        exprs.append(expr)
+    if not exprs:
+        return
+
+    with trace_request('print_selected_values', view):
+        max_repr = get_setting('print_max_repr', 10000)
+        code = template.format(exprs=exprs, max_repr=max_repr)
+        mark_stage('get_code')
         send_code_func(CodeBuffer(syntax, code))
 
 
@@ -258,9 +1289,15 @@ def reload_current_module(view, send_code_func):
     if not template:
         return error(f'No reload template for current syntax ({syntax}).')
 
-    package_path = find_module_package_path(file_path)
-    code = template.format(package_path=package_path)
-    send_code_func(CodeBuffer(syntax, code))
+    with trace_request('reload_module', view):
+        package_path = find_module_package_path(file_path)
+        code = template.format(
+            agent_name=AGENT_NAME,
+            package_path=package_path,
+            incremental=bool(get_setting('incremental_reload', True)),
+        )
+        mark_stage('get_code')
+        send_code_func(CodeBuffer(syntax, code))
 
 
 # Generic Sublime plugins
@@ -292,6 +1329,38 @@ class PrintExecScratchBufferCommand(sublime_plugin.TextCommand):
             print('No exec scratch buffer set.')
 
 
+class CancelExecRemoteQueueCommand(sublime_plugin.ApplicationCommand):
+    def run(self, app=None):
+        num_cancelled = cancel_queued(app)
+        sublime.status_message(f'{THIS_MODULE_NAME}: cancelled {num_cancelled} queued requests')
+
+
+class DumpExecRemoteStatsCommand(sublime_plugin.ApplicationCommand):
+    def run(self, file_path=None, reset=False):
+        rows = _LATENCY_STATS.summary()
+        if file_path:
+            file_path = os.path.expanduser(file_path)
+            with open(file_path, 'w', encoding='utf-8') as fp:
+                json.dump({'time': time.time(), 'stats': rows}, fp, indent=4)
+            print(f'{THIS_MODULE_NAME}: wrote latency stats to {file_path}')
+        else:
+            print(f'{THIS_MODULE_NAME} latency (ms):')
+            print(f'  {"command":<22} {"target":<22} {"stage":<14} {"count":>6} {"p50":>9} {"p95":>9} {"p99":>9} {"max":>9}')
+            for row in rows:
+                print('  {command:<22} {target:<22} {stage:<14} {count:>6} '
+                      '{p50_ms:>9.2f} {p95_ms:>9.2f} {p99_ms:>9.2f} {max_ms:>9.2f}'.format(**row))
+        if reset:
+            _LATENCY_STATS.reset()
+
+
+class PrintPackageIndexStatsCommand(sublime_plugin.ApplicationCommand):
+    def run(self):
+        index = _PACKAGE_INDEX
+        packages = sum(1 for entry in index.dirs.values() if entry[0])
+        print(f'{THIS_MODULE_NAME}: package index has {len(index.dirs)} directories ({packages} packages), '
+              f'{index.stats_saved} stat calls saved, {index.stats_made} made')
+
+
 # Maya Sublime plugins
 
 class MayaCommandEnabledMixin:
@@ -301,23 +1370,27 @@ class MayaCommandEnabledMixin:
 
 
 class ExecInMayaCommand(sublime_plugin.TextCommand, MayaCommandEnabledMixin):
-    def run(self, edit):
-        exec_current(self.view, send_code_to_maya)
+    def run(self, edit, group=None, changed_only=False):
+        send_code_func = functools.partial(send_code_to_maya, group=group)
+        if changed_only:
+            exec_changed(self.view, send_code_func, ('maya', group))
+        else:
+            exec_current(self.view, send_code_func)
 
 
 class ExecScratchBufferInMayaCommand(sublime_plugin.TextCommand, MayaCommandEnabledMixin):
-    def run(self, edit):
-        exec_scratch_buffer(self.view, send_code_to_maya)
+    def run(self, edit, group=None):
+        exec_scratch_buffer(self.view, functools.partial(send_code_to_maya, group=group))
 
 
 class PrintSelectedValuesInMayaCommand(sublime_plugin.TextCommand, MayaCommandEnabledMixin):
-    def run(self, edit):
-        print_selected_values(self.view, send_code_to_maya)
+    def run(self, edit, group=None):
+        print_selected_values(self.view, functools.partial(send_code_to_maya, group=group))
 
 
 class ReloadModuleInMayaCommand(sublime_plugin.TextCommand, MayaCommandEnabledMixin):
-    def run(self, edit):
-        reload_current_module(self.view, send_code_to_maya)
+    def run(self, edit, group=None):
+        reload_current_module(self.view, functools.partial(send_code_to_maya, group=group))
 
 
 # Blender Sublime plugins
@@ -329,20 +1402,24 @@ class BlenderCommandEnabledMixin:
 
 
 class ExecInBlenderCommand(sublime_plugin.TextCommand, BlenderCommandEnabledMixin):
-    def run(self, edit):
-        exec_current(self.view, send_code_to_blender)
+    def run(self, edit, group=None, changed_only=False):
+        send_code_func = functools.partial(send_code_to_blender, group=group)
+        if changed_only:
+            exec_changed(self.view, send_code_func, ('blender', group))
+        else:
+            exec_current(self.view, send_code_func)
 
 
 class ExecScratchBufferInBlenderCommand(sublime_plugin.TextCommand, BlenderCommandEnabledMixin):
-    def run(self, edit):
-        exec_scratch_buffer(self.view, send_code_to_blender)
+    def run(self, edit, group=None):
+        exec_scratch_buffer(self.view, functools.partial(send_code_to_blender, group=group))
 
 
 class PrintSelectedValuesInBlenderCommand(sublime_plugin.TextCommand, BlenderCommandEnabledMixin):
-    def run(self, edit):
-        print_selected_values(self.view, send_code_to_blender)
+    def run(self, edit, group=None):
+        print_selected_values(self.view, functools.partial(send_code_to_blender, group=group))
 
 
 class ReloadModuleInBlenderCommand(sublime_plugin.TextCommand, BlenderCommandEnabledMixin):
-    def run(self, edit):
-        reload_current_module(self.view, send_code_to_blender)
+    def run(self, edit, group=None):
+        reload_current_module(self.view, functools.partial(send_code_to_blender, group=group))
@@ -1,5 +1,4 @@
 import os
-import subprocess
 import sys
 
 import sublime, sublime_plugin
@@ -17,10 +16,13 @@ def platform():
 
 
 def open_winterm(profile_name, dir_path):
+    # subprocess is imported on first use to keep plugin host startup fast.
+    import subprocess
     subprocess.Popen(['wt', '-p', profile_name, '-d', dir_path], shell=False)
 
 
 def open_bash(dir_path):
+    import subprocess
     cmds = []
     if platform() == 'windows':
         open_winterm('git bash', dir_path)
@@ -99,6 +101,7 @@ class open_file_browser_here(open_shell_here):
 
     def open_shell(self, dir_path, file_name):
         if platform() == 'linux':
+            import subprocess
             subprocess.Popen(['dolphin', '--new-window', '--select', os.path.join(dir_path, file_name)])
         else:
             self.window.run_command('open_dir', {'dir': dir_path, 'file': file_name})
@@ -1,84 +1,234 @@
-import json
 import os
 import socket
 
 import sublime
-import sublime_plugin
 
-class per_host_settings(sublime_plugin.EventListener):
+
+HOST_SETTINGS_FILE = 'per_host_settings.sublime-settings'
+ON_CHANGE_TAG = 'per_host_settings'
+
+# ((hostname, mtime of HOST_SETTINGS_FILE), overlay)
+_overlay_cache = None
+
+
+def get_user_settings_path(settings_file):
+    return os.path.join(sublime.packages_path(), 'User', settings_file)
+
+
+def get_settings_mtime(settings_file):
+    try:
+        return os.stat(get_user_settings_path(settings_file)).st_mtime
+    except OSError:
+        return None
+
+
+def read_user_settings(settings_file, names):
+    """Returns (mtime, {name: value}) of names in the user's copy of
+    settings_file on disk, with None for the values if it can't be read."""
+    mtime = get_settings_mtime(settings_file)
+    try:
+        with open(get_user_settings_path(settings_file), encoding='utf-8') as fp:
+            values = sublime.decode_value(fp.read())
+    except OSError:
+        values = {}
+    except ValueError:
+        # Half edited.
+        return mtime, None
+    if not isinstance(values, dict):
+        return mtime, None
+    return mtime, {name: values.get(name) for name in names}
+
+
+def build_overlay(hostname):
+    """Merges the universal and platform settings for hostname into
+    {settings_file: {name: value}}."""
+    all_host_settings = sublime.load_settings(HOST_SETTINGS_FILE)
+    host_settings = all_host_settings.get(hostname)
+    if host_settings is None:
+        return {}
+    if not isinstance(host_settings, dict):
+        sublime.error_message('Settings for host "%s" is not a dict in "%s".' % (hostname, HOST_SETTINGS_FILE))
+        return {}
+
+    universal_settings = host_settings.get('universal', {})
+    if not isinstance(universal_settings, dict):
+        sublime.error_message('"universal" host settings is not a dict in "%s".' % HOST_SETTINGS_FILE)
+        return {}
+
+    platform_settings = host_settings.get(sublime.platform(), {})
+    if not isinstance(platform_settings, dict):
+        sublime.error_message('"%s" host settings is not a dict in "%s".' % (sublime.platform(), HOST_SETTINGS_FILE))
+        return {}
+
+    composite_settings = {
+        settings_file: dict(settings_values) for settings_file, settings_values in universal_settings.items()}
+    for settings_file, overlay_settings in platform_settings.items():
+        settings_values = composite_settings.setdefault(settings_file, {})
+        settings_values.update(overlay_settings)
+        for key in list(settings_values.keys()):
+            if settings_values[key] is None:
+                del settings_values[key]
+
+    for settings_file in list(composite_settings.keys()):
+        if not composite_settings[settings_file]:
+            del composite_settings[settings_file]
+    return composite_settings
+
+
+def load_overlay():
+    global _overlay_cache
+    hostname = socket.gethostname().lower()
+    key = (hostname, get_settings_mtime(HOST_SETTINGS_FILE))
+    if _overlay_cache is None or _overlay_cache[0] != key:
+        _overlay_cache = (key, build_overlay(hostname))
+    return _overlay_cache[1]
+
+
+class PerHostSettings(object):
+    """Keeps this host's overlay applied on top of the settings files it
+    names.
+
+    There's one on_change listener per settings file.  When one fires, the
+    overlay is only applied again if the user's copy of the file was
+    reloaded from disk (its mtime changed), and then only to the overlaid
+    keys the reload changed: those that went from what they were at the
+    last check to the value on disk, where that value hasn't changed since
+    the last check either.  Anything else is a change the user made, e.g.
+    font_size with ctrl-+ (which saves the file too), and is left alone,
+    whatever value it lands on.
+    """
+
     def __init__(self):
-        self._applying = False
-
-    def install_callbacks(self):
-        callbacks = []
-        if '_per_host_settings_callbacks_installed' not in globals():
-            try:
-                host_settings_file = 'per_host_settings.sublime-settings'
-                all_host_settings = sublime.load_settings(host_settings_file)
-                hostname = socket.gethostname().lower()
-                host_settings = all_host_settings.get(hostname)
-                if host_settings is None:
-                    return callbacks
-                if not isinstance(host_settings, dict):
-                    sublime.error_message('Settings for host "%s" is not a dict in "%s".' % (hostname, host_settings_file))
-                    return callbacks
-
-                universal_settings = host_settings.get('universal', {})
-                if not isinstance(universal_settings, dict):
-                    sublime.error_message('"universal" host settings is not a dict in "%s".' % host_settings_file)
-                    return callbacks
-
-                platform_settings = host_settings.get(sublime.platform(), {})
-                if not isinstance(platform_settings, dict):
-                    sublime.error_message('"%s" host settings is not a dict in "%s".' % (host_settings_file, sublime.platform()))
-                    return callbacks
-
-                composite_settings = universal_settings
-                for settings_file, overlay_settings in platform_settings.items():
-                    settings_values = composite_settings.setdefault(settings_file, {})
-                    settings_values.update(overlay_settings)
-                    for key in list(settings_values.keys()):
-                        if settings_values[key] is None:
-                            del settings_values[key]
-
-                for settings_file in list(composite_settings.keys()):
-                    if not composite_settings[settings_file]:
-                        del composite_settings[settings_file]
-                if not composite_settings:
-                    return callbacks
-
-                print('Installing per-host settings for "%s"' % hostname)
-                for settings_file, settings_values in composite_settings.items():
-                    settings = sublime.load_settings(settings_file)
-                    for name, value in settings_values.items():
-                        print('  "{0}, {1} = {2}"'.format(settings_file, name, value))
-                        def make_callback(settings, name, value):
-                            return lambda: self.apply_value(settings, name, value)
-                        callback = make_callback(settings, name, value)
-                        callbacks.append(callback)
-                        settings.add_on_change(name, callback)
-            finally:
-                global _per_host_settings_callbacks_installed
-                _per_host_settings_callbacks_installed = True
-        return callbacks
-
-    def on_activated(self, view):
-        # disable this for now... conflicting with ctrl-+ to adjust font size now, broke at some
-        # point on/before build 4199.
-        return
-
-        # Apply once on startup, before the settings on_change callbacks
-        # have a chance to run.
-        callbacks = self.install_callbacks()
-        for callback in callbacks:
-            callback()
-        sublime_plugin.all_callbacks['on_activated'].remove(self)
-
-    def apply_value(self, settings, name, value):
-        if not self._applying:
-            try:
-                self._applying = True
-                print('Applying per-host setting "{0} = {1}"'.format(name, value))
-                settings.set(name, value)
-            finally:
-                self._applying = False
+        # settings_file -> {name: value}
+        self.overlay = {}
+        # settings_file -> {name: value before the overlay was applied}
+        self.base = {}
+        # settings_file -> (mtime, {name: value}) of the overlaid names in
+        # the user's copy on disk, as of the last check
+        self.disk = {}
+        # settings_file -> {name: value} of the overlaid names as of the last
+        # check
+        self.seen = {}
+        self.dirty = set()
+        self.apply_scheduled = False
+        self.applying = False
+
+    def start(self):
+        sublime.load_settings(HOST_SETTINGS_FILE).add_on_change(ON_CHANGE_TAG, self.reload)
+        self.reload()
+
+    def stop(self):
+        sublime.load_settings(HOST_SETTINGS_FILE).clear_on_change(ON_CHANGE_TAG)
+        for settings_file, settings_values in self.overlay.items():
+            sublime.load_settings(settings_file).clear_on_change(ON_CHANGE_TAG)
+            self.restore(settings_file, settings_values)
+        self.overlay = {}
+
+    def restore(self, settings_file, names):
+        # Put back the values from before the overlay, unless they've been
+        # changed since.
+        settings = sublime.load_settings(settings_file)
+        settings_values = self.overlay[settings_file]
+        base = self.base.get(settings_file, {})
+        self.applying = True
+        try:
+            for name in names:
+                if settings.get(name) == settings_values[name]:
+                    if base.get(name) is None:
+                        settings.erase(name)
+                    else:
+                        settings.set(name, base[name])
+                base.pop(name, None)
+        finally:
+            self.applying = False
+
+    def reload(self):
+        overlay = load_overlay()
+        if overlay == self.overlay:
+            return
+
+        hostname = socket.gethostname().lower()
+        print('Installing per-host settings for "%s"' % hostname)
+        for settings_file, settings_values in self.overlay.items():
+            if settings_file not in overlay:
+                sublime.load_settings(settings_file).clear_on_change(ON_CHANGE_TAG)
+                self.disk.pop(settings_file, None)
+                self.seen.pop(settings_file, None)
+            still_overlaid = overlay.get(settings_file, {})
+            self.restore(settings_file, [name for name in settings_values if name not in still_overlaid])
+
+        # Values new to the overlay are applied whatever the setting is now.
+        changed = set()
+        for settings_file, settings_values in overlay.items():
+            settings = sublime.load_settings(settings_file)
+            if settings_file not in self.overlay:
+                settings.add_on_change(ON_CHANGE_TAG, lambda settings_file=settings_file: self.on_change(settings_file))
+            old_values = self.overlay.get(settings_file, {})
+            base = self.base.setdefault(settings_file, {})
+            for name, value in settings_values.items():
+                print('  "{0}, {1} = {2}"'.format(settings_file, name, value))
+                if name not in base:
+                    base[name] = settings.get(name)
+                if name not in old_values or old_values[name] != value:
+                    changed.add((settings_file, name))
+            self.disk[settings_file] = read_user_settings(settings_file, settings_values)
+        self.overlay = overlay
+        self.apply(overlay, changed)
+
+    def on_change(self, settings_file):
+        if self.applying:
+            return
+        # Changes tend to come in bursts (a whole file reloading), so check
+        # once they've settled.
+        self.dirty.add(settings_file)
+        if not self.apply_scheduled:
+            self.apply_scheduled = True
+            sublime.set_timeout(self.apply_dirty, 0)
+
+    def apply_dirty(self):
+        self.apply_scheduled = False
+        dirty, self.dirty = self.dirty, set()
+        self.apply(dirty)
+
+    @staticmethod
+    def was_reloaded(current, last_seen, name, disk_values, old_disk_values):
+        if disk_values is None or old_disk_values is None or current == last_seen:
+            return False
+        return current == disk_values.get(name) == old_disk_values.get(name)
+
+    def apply(self, settings_files, force=()):
+        self.applying = True
+        try:
+            for settings_file in settings_files:
+                settings_values = self.overlay.get(settings_file)
+                if not settings_values:
+                    continue
+                settings = sublime.load_settings(settings_file)
+                old_mtime, old_disk_values = self.disk.get(settings_file, (None, None))
+                reloaded = get_settings_mtime(settings_file) != old_mtime
+                if reloaded:
+                    self.disk[settings_file] = read_user_settings(settings_file, settings_values)
+                disk_values = self.disk[settings_file][1]
+                seen = self.seen.setdefault(settings_file, {})
+                for name, value in settings_values.items():
+                    current = settings.get(name)
+                    if current != value and (
+                            (settings_file, name) in force or
+                            reloaded and self.was_reloaded(current, seen.get(name), name, disk_values, old_disk_values)):
+                        print('Applying per-host setting "{0} = {1}"'.format(name, value))
+                        settings.set(name, value)
+                        current = value
+                    seen[name] = current
+        finally:
+            self.applying = False
+
+
+_per_host_settings = PerHostSettings()
+
+
+def plugin_loaded():
+    _per_host_settings.start()
+
+
+def plugin_unloaded():
+    _per_host_settings.stop()
@@ -0,0 +1,482 @@
+"""Resident agent for exec_remote.
+
+This module never runs inside Sublime.  exec_remote sends it over the
+command port and installs it as a module in Maya's or Blender's Python the
+first time it connects, after which every request is a single short call
+into it.  It has to stay compatible with the oldest Python those hosts
+ship with (3.7).
+"""
+import __main__
+import ast
+import collections
+import contextlib
+import datetime
+import hashlib
+import importlib
+import json
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+import traceback
+
+
+# Set by exec_remote when it installs the module.
+VERSION = None
+RECEIVER_NAME = None
+# When to rehash before running MEL: 'auto' (when a .mel file was added to
+# the script path), 'always' or 'never'.
+MEL_REHASH = 'auto'
+
+# Number of compiled requests kept per client session.  exec_remote keeps a
+# mirror of this cache, so the two must be touched in the same order and
+# have the same size.
+CACHE_SIZE = 64
+
+# Client sessions kept beyond those with a live output channel.  Every
+# reload of exec_remote in Sublime is a new session, so the least recently
+# used of the rest are dropped along with their cache.  Clients only count
+# on the cache while their output channel is up (it's how they hear about
+# a CacheMiss), so a session with one is never dropped.
+MAX_SESSIONS = 4
+
+# session id -> OrderedDict(digest -> (source, code, compile error))
+_caches = collections.OrderedDict()
+
+# session id -> _OutputChannel
+_channels = {}
+
+# MAYA_SCRIPT_PATH directory -> (st_mtime_ns, names of its .mel files), or
+# None before the first MEL request.
+_mel_dirs = None
+
+# module name -> ((st_mtime_ns, st_size), digest) of the source as of the
+# last time the module was loaded or first seen by reload_modules.
+_module_stamps = {}
+# module name -> (digest, names of the modules it imports)
+_module_imports = {}
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class _OutputChannel:
+    """Streams output back to one Sublime session.
+
+    Messages are length prefixed: a one byte kind ('h' hello, 'o' stdout,
+    'e' stderr, 'x' exception, 't' request timings as json, 'm' digest of a
+    request that was no longer cached), a four byte
+    big endian length, then that many bytes of utf-8 text.  They're sent from a background thread through
+    a bounded queue, so code that prints a lot is never held up by Sublime,
+    and what doesn't fit in the queue is dropped and counted instead.  No
+    message is longer than MAX_MESSAGE characters; longer writes are
+    truncated.
+    """
+
+    MAX_QUEUED = 1024
+    MAX_MESSAGE = 65536
+
+    def __init__(self, address, label):
+        self.sock = socket.create_connection(address, 1.0)
+        self.queue = queue.Queue(self.MAX_QUEUED)
+        self.dropped = 0
+        self.closed = False
+        self.send('h', label)
+        self.thread = threading.Thread(target=self._run, name='exec_remote output', daemon=True)
+        self.thread.start()
+
+    def send(self, kind, text):
+        if self.closed:
+            return
+        if len(text) > self.MAX_MESSAGE:
+            notice = f'\n[exec_remote: {len(text) - self.MAX_MESSAGE} characters truncated]\n'
+            text = text[:self.MAX_MESSAGE - len(notice)] + notice
+        try:
+            self.queue.put_nowait((kind, text))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        self.closed = True
+        try:
+            self.queue.put_nowait((None, None))
+        except queue.Full:
+            self.sock.close()
+
+    def _run(self):
+        try:
+            while True:
+                kind, text = self.queue.get()
+                if kind is None:
+                    break
+                # Coalesce queued writes to the same stream, print() alone
+                # makes two of them.
+                parts = [text]
+                size = len(text)
+                while kind in 'oe':
+                    try:
+                        next_kind, next_text = self.queue.queue[0]
+                    except IndexError:
+                        break
+                    if next_kind != kind or size + len(next_text) > self.MAX_MESSAGE:
+                        break
+                    self.queue.get_nowait()
+                    parts.append(next_text)
+                    size += len(next_text)
+                if self.dropped:
+                    parts.append(f'\n[exec_remote: {self.dropped} writes dropped]\n')
+                    self.dropped = 0
+                data = ''.join(parts).encode('utf-8', 'replace')
+                self.sock.sendall(struct.pack('!cI', kind.encode('ascii'), len(data)) + data)
+        except OSError:
+            pass
+        finally:
+            self.closed = True
+            self.sock.close()
+
+
+class _TeeWriter:
+    def __init__(self, stream, channel, kind):
+        self._stream = stream
+        self._channel = channel
+        self._kind = kind
+
+    def write(self, text):
+        self._channel.send(self._kind, text)
+        return self._stream.write(text)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def _get_cache(session_id):
+    cache = _caches.get(session_id)
+    if cache is None:
+        cache = _caches[session_id] = collections.OrderedDict()
+        for old_session_id in list(_caches):
+            if len(_caches) <= MAX_SESSIONS:
+                break
+            old_channel = _channels.get(old_session_id)
+            if old_session_id == session_id or (old_channel and not old_channel.closed):
+                continue
+            del _caches[old_session_id]
+            _channels.pop(old_session_id, None)
+    else:
+        _caches.move_to_end(session_id)
+    return cache
+
+
+def attach_output(session_id, host, port, label):
+    """Sends the output of this session's requests to host:port, as well as
+    to wherever it normally goes."""
+    # Every session with a channel has a cache.
+    _get_cache(session_id)
+    old_channel = _channels.pop(session_id, None)
+    if old_channel:
+        old_channel.close()
+    _channels[session_id] = _OutputChannel((host, port), label)
+
+
+@contextlib.contextmanager
+def _capture_output(session_id):
+    channel = _channels.get(session_id)
+    if channel is None or channel.closed:
+        yield
+        return
+    stdout, stderr = sys.stdout, sys.stderr
+    sys.stdout = _TeeWriter(stdout, channel, 'o')
+    sys.stderr = _TeeWriter(stderr, channel, 'e')
+    try:
+        yield
+    finally:
+        sys.stdout, sys.stderr = stdout, stderr
+
+
+def _report_exception(session_id):
+    channel = _channels.get(session_id)
+    if channel:
+        channel.send('x', traceback.format_exc())
+    sys.excepthook(*sys.exc_info())
+
+
+def _maya():
+    # maya.cmds is always loaded in the GUI and in initialized mayapy
+    # sessions.  Checking for it avoids a failing import on every request
+    # in Blender.
+    if 'maya.cmds' not in sys.modules:
+        return None
+    import maya.cmds
+    import maya.mel
+    return maya
+
+
+def _send_timings(session_id, request_id, stages):
+    channel = _channels.get(session_id)
+    if channel:
+        channel.send('t', json.dumps({'request_id': request_id, 'stages': stages}))
+
+
+def _compile(source, syntax):
+    # Returns (code, compile error).
+    if syntax != 'python':
+        return None, None
+    try:
+        return compile(source, '<exec_remote>', 'exec'), None
+    except (SyntaxError, ValueError) as ex:
+        return None, ex
+
+
+def _load(session_id, request_id, digest, syntax, sent):
+    cache = _get_cache(session_id)
+    entry = cache.get(digest)
+    if entry is not None:
+        cache.move_to_end(digest)
+        if sent:
+            sys.modules[RECEIVER_NAME].take(request_id)
+    else:
+        if not sent:
+            # Tell the client to stop counting on the cache, so the next
+            # run sends the code again.
+            channel = _channels.get(session_id)
+            if channel:
+                channel.send('m', digest)
+            raise CacheMiss(f'Request {digest} is no longer cached, send it again')
+        source = sys.modules[RECEIVER_NAME].take(request_id)
+        # Code that doesn't compile is cached too, as the client counts it
+        # as cached once it's been sent.  Running it again reports the same
+        # error.
+        entry = cache[digest] = (source,) + _compile(source, syntax)
+        while len(cache) > CACHE_SIZE:
+            cache.popitem(last=False)
+
+    source, code, compile_error = entry
+    if compile_error is not None:
+        raise compile_error.with_traceback(None)
+    return source, code
+
+
+def _new_mel_scripts():
+    """Returns the .mel files that appeared on MAYA_SCRIPT_PATH since the
+    last call, or None on the first call.
+
+    Adding a file changes its directory's mtime, so a directory is only
+    listed again when its mtime changed.  Like rehash, only the path's
+    directories themselves are looked at, not their subdirectories.
+    """
+    global _mel_dirs
+    old_dirs = _mel_dirs
+    new_dirs = {}
+    new_scripts = []
+    for dir_path in os.environ.get('MAYA_SCRIPT_PATH', '').split(os.pathsep):
+        if not dir_path or dir_path in new_dirs:
+            continue
+        try:
+            mtime = os.stat(dir_path).st_mtime_ns
+        except OSError:
+            continue
+        entry = old_dirs.get(dir_path) if old_dirs else None
+        if entry and entry[0] == mtime:
+            new_dirs[dir_path] = entry
+            continue
+        try:
+            names = {name for name in os.listdir(dir_path) if name.lower().endswith('.mel')}
+        except OSError:
+            names = set()
+        if old_dirs is not None:
+            new_scripts.extend(sorted(names - entry[1]) if entry else sorted(names))
+        new_dirs[dir_path] = (mtime, names)
+    _mel_dirs = new_dirs
+    return None if old_dirs is None else new_scripts
+
+
+def _eval_mel(maya, source):
+    """Runs MEL, rehashing first only if MEL_REHASH calls for it.  Returns
+    how long the rehash took, or None if there wasn't one."""
+    rehash_time = None
+    if MEL_REHASH == 'always':
+        reason = None
+    elif MEL_REHASH == 'auto':
+        new_scripts = _new_mel_scripts()
+        if new_scripts is None:
+            reason = 'first MEL request'
+        elif new_scripts:
+            reason = 'new scripts: ' + ', '.join(new_scripts)
+        else:
+            reason = ''
+    else:
+        reason = ''
+    if reason != '':
+        start_time = time.perf_counter()
+        maya.mel.eval('rehash')
+        rehash_time = time.perf_counter() - start_time
+        if reason:
+            print(f'exec_remote: rehash took {rehash_time * 1000:.1f} ms ({reason})')
+    maya.mel.eval(source)
+    return rehash_time
+
+
+def exec_code(session_id, request_id, digest, syntax, sent):
+    """Runs a request.  If sent is false the client expects the code to
+    already be cached under digest."""
+    stages = {}
+    stage_start = time.perf_counter()
+    maya = _maya()
+    if maya:
+        maya.cmds.undoInfo(openChunk=True, chunkName='Sublime Code Eval')
+    try:
+        now_str = datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        source, code = _load(session_id, request_id, digest, syntax, sent)
+        stages['load'] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+        with _capture_output(session_id):
+            if code is not None:
+                exec(code, __main__.__dict__, __main__.__dict__)
+            else:
+                rehash_time = _eval_mel(maya, source)
+                if rehash_time is not None:
+                    stages['rehash'] = rehash_time
+        stages['exec'] = time.perf_counter() - stage_start - stages.get('rehash', 0.0)
+        if maya:
+            msg = f'<span style="color:rgb(255,192,192)">{now_str}: Evaluated Sublime code</span>'
+            maya.cmds.inViewMessage(statusMessage=msg, fade=True, fadeInTime=0, fadeStayTime=500, fadeOutTime=500)
+    except Exception:
+        _report_exception(session_id)
+    finally:
+        if maya:
+            maya.cmds.undoInfo(closeChunk=True)
+    _send_timings(session_id, request_id, stages)
+
+
+def _package_modules(root):
+    """Returns {name: path} for the loaded pure Python modules in package root."""
+    modules = {}
+    prefix = root + '.'
+    for name, module in list(sys.modules.items()):
+        if name != root and not name.startswith(prefix):
+            continue
+        path = getattr(module, '__file__', None)
+        if path and path.endswith('.py'):
+            modules[name] = path
+    return modules
+
+
+def _find_imports(name, path, source, known):
+    # Only imports of other modules in the same package matter, and since
+    # every loaded module of the package is known, anything that isn't in
+    # known can be ignored.
+    is_package = os.path.basename(path) == '__init__.py'
+    package = name if is_package else name.rpartition('.')[0]
+    imports = set()
+    for node in ast.walk(ast.parse(source, path)):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                imports.add(alias.name)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                parts = package.split('.')
+                base = '.'.join(parts[:len(parts) - node.level + 1])
+                base = f'{base}.{node.module}' if node.module else base
+            else:
+                base = node.module
+            imports.add(base)
+            for alias in node.names:
+                imports.add(f'{base}.{alias.name}')
+    imports.discard(name)
+    return imports & known
+
+
+def _topological_order(names, imports):
+    # Dependencies first.  Import cycles are broken in name order.
+    remaining = {name: imports[name] & names for name in names}
+    order = []
+    while remaining:
+        ready = sorted(name for name, deps in remaining.items() if not deps)
+        if not ready:
+            ready = [min(remaining)]
+        for name in ready:
+            del remaining[name]
+            order.append(name)
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return order
+
+
+def reload_modules(module_name):
+    """Reloads the modules in module_name's package whose source changed
+    since they were loaded, plus everything that imports them, in
+    dependency order.  module_name itself is always reloaded.
+
+    Changes are tracked from the first call for a package on, since there's
+    no record of what a module's source was when it was first imported.
+    """
+    start_time = time.perf_counter()
+    if module_name not in sys.modules:
+        importlib.import_module(module_name)
+        print(f'Imported {module_name} ({(time.perf_counter() - start_time) * 1000:.1f} ms)')
+        return
+
+    root = module_name.split('.')[0]
+    modules = _package_modules(root)
+    known = set(modules)
+    changed = {module_name}
+    new_stamps = {}
+    for name, path in modules.items():
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        key = (stat.st_mtime_ns, stat.st_size)
+        old_stamp = _module_stamps.get(name)
+        if old_stamp and old_stamp[0] == key and name in _module_imports:
+            continue
+        with open(path, 'rb') as fp:
+            source = fp.read()
+        digest = hashlib.sha1(source).hexdigest()
+        if _module_imports.get(name, (None,))[0] != digest:
+            try:
+                _module_imports[name] = (digest, _find_imports(name, path, source, known))
+            except SyntaxError:
+                _module_imports[name] = (digest, set())
+        if old_stamp is None:
+            _module_stamps[name] = (key, digest)
+        elif old_stamp[1] != digest:
+            changed.add(name)
+        new_stamps[name] = (key, digest)
+    imports = {name: _module_imports.get(name, (None, set()))[1] & known for name in modules}
+
+    dependents = collections.defaultdict(set)
+    for name, deps in imports.items():
+        for dep in deps:
+            dependents[dep].add(name)
+    to_reload = set()
+    pending = list(changed)
+    while pending:
+        name = pending.pop()
+        if name not in to_reload:
+            to_reload.add(name)
+            pending.extend(dependents[name])
+    scan_time = time.perf_counter() - start_time
+
+    reloaded = []
+    for name in _topological_order(to_reload, imports):
+        reload_start = time.perf_counter()
+        try:
+            importlib.reload(sys.modules[name])
+        except Exception:
+            sys.excepthook(*sys.exc_info())
+            print(f'Stopped reloading at {name}')
+            break
+        if name in new_stamps:
+            _module_stamps[name] = new_stamps[name]
+        reason = 'changed' if name in changed else 'dependent'
+        reloaded.append((name, reason, time.perf_counter() - reload_start))
+
+    total_time = time.perf_counter() - start_time
+    print(f'Reloaded {len(reloaded)} of {len(modules)} modules in {root} '
+          f'({total_time * 1000:.1f} ms, scan {scan_time * 1000:.1f} ms)')
+    for name, reason, elapsed in reloaded:
+        print(f'  {name} ({reason}, {elapsed * 1000:.1f} ms)')
@@ -0,0 +1,201 @@
+"""Command port for exec_remote in Blender.
+
+Blender has no command port of its own, so install this file as an add-on
+(Edit > Preferences > Add-ons > Install...) and enable it.  It listens on
+127.0.0.1:7112 (or $EXEC_REMOTE_BLENDER_PORT), matching blender_port,
+blender_protocol "framed" and blender_wire "length_prefixed" in
+exec_remote.sublime-settings.
+
+Connections are accepted and read on background threads.  Received
+commands are queued and run on the main thread from a bpy.app.timers
+callback, which runs as many as fit in TICK_BUDGET seconds and then hands
+control back to Blender so the UI keeps redrawing between them.  A single
+long running command still blocks the UI for as long as it runs.
+
+Each command arrives as a four byte big endian length followed by that
+many bytes of utf-8 Python source.  Once it has run, the server replies
+with a nul terminated string, as Maya's commandPort does.
+
+Only register() and unregister() touch bpy, so CommandPortServer can be
+driven headless by calling run_pending() directly, and the add-on as a
+whole against a stub bpy (see benchmarks/check_blender_addon.py).
+"""
+import __main__
+import os
+import queue
+import socket
+import struct
+import sys
+import threading
+import time
+import traceback
+
+
+bl_info = {
+    'name': 'exec_remote command port',
+    'description': 'Runs Python sent from Sublime Text by exec_remote.',
+    'version': (1, 0),
+    'blender': (2, 80, 0),
+    'category': 'Development',
+}
+
+HOST = '127.0.0.1'
+PORT = int(os.environ.get('EXEC_REMOTE_BLENDER_PORT', 7112))
+# Longest a single timer tick keeps running queued commands.
+TICK_BUDGET = 0.02
+# Timer intervals when idle and when commands are still waiting.
+IDLE_INTERVAL = 0.05
+BUSY_INTERVAL = 0.0
+MAX_COMMAND_SIZE = 256 * 1024 * 1024
+
+
+class _Command:
+    __slots__ = ('source', 'done', 'ran')
+
+    def __init__(self, source):
+        self.source = source
+        self.done = threading.Event()
+        self.ran = False
+
+
+class CommandPortServer:
+    def __init__(self, host=HOST, port=PORT, namespace=None):
+        self.address = (host, port)
+        self.namespace = namespace if namespace is not None else __main__.__dict__
+        self.commands = queue.Queue()
+        self.sock = None
+        self.running = False
+        self.connections = set()
+        self.connections_lock = threading.Lock()
+
+    def start(self):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(self.address)
+        self.sock.listen()
+        self.address = self.sock.getsockname()
+        self.running = True
+        threading.Thread(target=self._accept, name='exec_remote accept', daemon=True).start()
+
+    def stop(self):
+        self.running = False
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+        # Drop every connection, so clients see the commands they're
+        # waiting on fail rather than an answer for code that never ran.
+        with self.connections_lock:
+            for conn in self.connections:
+                try:
+                    conn.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+        # Release any connection threads waiting on commands that will
+        # never run now.
+        while True:
+            try:
+                self.commands.get_nowait().done.set()
+            except queue.Empty:
+                break
+
+    def run_pending(self, budget=TICK_BUDGET):
+        """Runs queued commands on the calling (main) thread for up to
+        budget seconds.  Returns the delay until it should be called
+        again, for bpy.app.timers."""
+        deadline = time.perf_counter() + budget
+        while time.perf_counter() < deadline:
+            try:
+                command = self.commands.get_nowait()
+            except queue.Empty:
+                return IDLE_INTERVAL
+            try:
+                exec(compile(command.source, '<exec_remote>', 'exec'), self.namespace)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                command.ran = True
+                command.done.set()
+        return BUSY_INTERVAL
+
+    def _accept(self):
+        while self.running:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(conn,), name='exec_remote connection', daemon=True).start()
+
+    def _serve(self, conn):
+        with self.connections_lock:
+            self.connections.add(conn)
+        try:
+            while self.running:
+                header = _recv_exactly(conn, 4)
+                if not header:
+                    break
+                (length,) = struct.unpack('!I', header)
+                if length > MAX_COMMAND_SIZE:
+                    break
+                command = _Command(_recv_exactly(conn, length).decode('utf-8'))
+                self.commands.put(command)
+                # Queued after stop() emptied the queue, it would never run.
+                if not self.running:
+                    break
+                # Commands from one connection run one at a time, in order,
+                # and are answered once they've run.
+                command.done.wait()
+                if not command.ran:
+                    break
+                conn.sendall(b'\n\0')
+        except (OSError, UnicodeDecodeError):
+            pass
+        finally:
+            with self.connections_lock:
+                self.connections.discard(conn)
+            conn.close()
+
+
+def _recv_exactly(conn, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            if data:
+                raise ConnectionResetError('Connection closed mid-command')
+            return b''
+        data += chunk
+    return bytes(data)
+
+
+_server = None
+
+
+def _tick():
+    if _server is None:
+        return None
+    return _server.run_pending()
+
+
+def register():
+    import bpy
+    global _server
+    _server = CommandPortServer()
+    try:
+        _server.start()
+    except OSError as ex:
+        print(f'exec_remote: could not listen on {HOST}:{PORT}: {ex}', file=sys.stderr)
+        _server = None
+        return
+    bpy.app.timers.register(_tick, persistent=True)
+    print('exec_remote: listening on {}:{}'.format(*_server.address))
+
+
+def unregister():
+    import bpy
+    global _server
+    if bpy.app.timers.is_registered(_tick):
+        bpy.app.timers.unregister(_tick)
+    if _server:
+        _server.stop()
+        _server = None
@@ -1,48 +1,155 @@
+import collections
+import threading
+from array import array
+
 import sublime
 import sublime_plugin
 
 
-stack_views = {}
+# Views are forgotten least recently used first beyond this many, which
+# only loses their sticky column.
+MAX_TRACKED_VIEWS = 32
+
+EVENT_SELECTION_MODIFIED = 0
+EVENT_MODIFIED = 1
+
+stack_views = collections.OrderedDict()
+stack_views_lock = threading.Lock()
 
 
 class SmartCursorView(object):
+    __slots__ = (
+        'view', 'events', 'lock', 'points', 'points_row', 'selmodcol', 'selmodrow', 'selmodxpos', 'last_selmod')
 
     def __init__(self, view):
         self.view = view
-        self.selcol = None
+        # (event, selection fingerprint, change count) for every event not
+        # processed yet, oldest first.
+        self.events = collections.deque()
+        self.lock = threading.Lock()
+        # Caret points as of the last selection change.  Only kept up to date
+        # while no run of edits is in progress, as the first edit of a run is
+        # all that needs them.
+        self.points = array('q')
+        # Row of the first caret as of the last selection change.
+        self.points_row = None
+        # Columns the carets were at when the current run of edits began, and
+        # the row of the first caret.  The layout x of each column is only
+        # worked out when a smart_cursor move needs it.
         self.selmodcol = None
+        self.selmodrow = None
+        self.selmodxpos = None
         self.last_selmod = None
 
-    def save_sel(self):
-        self.selcol = []
-        for sel in list(self.view.sel()):
-            self.selcol.append(
-                (self.view.rowcol(sel.a), self.view.text_to_layout(sel.a)[0]))
+    def fingerprint(self):
+        # Cheap stand in for the whole selection: telling an edit's own
+        # selection change from the user moving the carets only needs this.
+        sel = self.view.sel()
+        count = len(sel)
+        if not count:
+            return (0,)
+        first = sel[0]
+        last = sel[count - 1]
+        return (count, first.a, first.b, last.a, last.b)
+
+    def record(self, event):
+        # Runs on the UI thread for every event, so only notes what the
+        # selection looked like at the time.  The rest is done by
+        # process_events() on the async thread, or by the next smart_cursor
+        # command if that comes first.
+        self.events.append((event, self.fingerprint(), self.view.change_count()))
+
+    def process_events(self):
+        with self.lock:
+            while self.events:
+                event, fingerprint, change_count = self.events.popleft()
+                if event == EVENT_SELECTION_MODIFIED:
+                    self.check_reset(fingerprint)
+                    if self.selmodcol is None:
+                        self.save_sel(change_count)
+                else:
+                    self.save_reset(fingerprint)
+                    self.save()
+
+    def save_sel(self, change_count):
+        points = self.points
+        del points[:]
+        # If the buffer has been edited since, the carets have moved on and
+        # there's no telling where they were, so sit this run of edits out.
+        if self.view.change_count() != change_count:
+            return
+        for sel in self.view.sel():
+            points.append(sel.a)
+        if points:
+            self.points_row = self.view.rowcol(points[0])[0]
 
     def save(self):
-        if not self.selmodcol and self.selcol is not None:
-            self.selmodcol = self.selcol[:]
+        if self.selmodcol is not None:
+            return
+        sel = self.view.sel()
+        if not self.points or len(sel) != len(self.points):
+            return
+        # The carets have already moved by the time on_modified is called.
+        # Each one moved by its own edit plus everything inserted at the
+        # carets before it, so take off its own edit to get back to the
+        # column it was at.
+        cols = array('q')
+        first_row = None
+        shift = 0
+        for old_point, region in zip(self.points, sel):
+            row, col = self.view.rowcol(region.a)
+            moved = region.a - old_point
+            cols.append(col - (moved - shift))
+            shift = moved
+            if first_row is None:
+                first_row = row
+        # An edit that moved the first caret to another row (enter, a
+        # multi-line paste, backspace at column 0) starts a new line, not a
+        # run of edits with a column to stick to.
+        if first_row != self.points_row:
+            return
+        self.selmodcol = cols
+        self.selmodrow = first_row
+        self.selmodxpos = None
 
     def reset(self):
         self.selmodcol = None
+        self.selmodxpos = None
 
-    def save_reset(self):
-        self.last_selmod = list(self.view.sel())[:]
+    def save_reset(self, fingerprint):
+        self.last_selmod = fingerprint
 
-    def check_reset(self):
-        if self.last_selmod is not None and self.last_selmod != list(self.view.sel()):
+    def check_reset(self, fingerprint):
+        if self.last_selmod is not None and self.last_selmod != fingerprint:
             self.reset()
-        elif self.selmodcol:
-            for sel, (selmod, xpos) in zip(self.view.sel(), self.selmodcol):
-                if self.view.rowcol(sel.a)[0] != selmod[0]:
-                    self.reset()
-                    return
+        elif self.selmodcol is not None:
+            # Typing a newline moves every caret down, the first included.
+            # Later edits are all at or after the first caret, so its row
+            # can still be looked up after them.
+            if len(fingerprint) == 1 or self.view.rowcol(fingerprint[1])[0] != self.selmodrow:
+                self.reset()
+
+    def get_xpos(self, sel):
+        if self.selmodxpos is None:
+            xpos = array('d')
+            for region, col in zip(sel, self.selmodcol):
+                line = self.view.line(region.a)
+                point = max(line.a, line.a + col)
+                if point > line.b:
+                    # The column was past what's now the end of the line
+                    # (e.g. after a backspace).
+                    xpos.append(self.view.text_to_layout(line.b)[0] + (point - line.b) * self.view.em_width())
+                else:
+                    xpos.append(self.view.text_to_layout(point)[0])
+            self.selmodxpos = xpos
+        return self.selmodxpos
 
     def get_new_sel(self, forward=None):
         new_sel = []
         if self.selmodcol is not None:
-            if len(self.view.sel()) == len(self.selmodcol):
-                for sel, (selmod, xpos) in zip(self.view.sel(), self.selmodcol):
+            sel = self.view.sel()
+            if len(sel) == len(self.selmodcol):
+                for sel, xpos in zip(sel, self.get_xpos(sel)):
                     caret_pos = sel.a
                     line_end_pos = self.view.full_line(caret_pos).end() - 1
                     # when the cursor is at the last line, setting the xpos move the cursor horizontally.
@@ -58,38 +165,53 @@ class SmartCursorView(object):
 
 
 def stack_view(view):
-    if not view.id() in stack_views:
-        stack_views[view.id()] = SmartCursorView(view)
-    return stack_views[view.id()]
+    with stack_views_lock:
+        stack = stack_views.get(view.id())
+        if stack is None:
+            stack = stack_views[view.id()] = SmartCursorView(view)
+            while len(stack_views) > MAX_TRACKED_VIEWS:
+                stack_views.popitem(last=False)
+        else:
+            stack_views.move_to_end(view.id())
+        return stack
+
+
+class SmartCursorListener(sublime_plugin.ViewEventListener):
+
+    @classmethod
+    def is_applicable(cls, settings):
+        return not settings.get('is_widget')
 
+    def on_close(self):
+        with stack_views_lock:
+            stack_views.pop(self.view.id(), None)
 
-class SmartCursorListener(sublime_plugin.EventListener):
+    def on_selection_modified(self):
+        stack_view(self.view).record(EVENT_SELECTION_MODIFIED)
 
-    def on_close(self, view):
-        if view.id() in stack_views:
-            stack_views[view.id()].view = None
-            del stack_views[view.id()]
+    def on_selection_modified_async(self):
+        stack_view(self.view).process_events()
 
-    def on_selection_modified(self, view):
-        stack = stack_view(view)
-        stack.check_reset()
-        stack.save_sel()
+    def on_modified(self):
+        stack_view(self.view).record(EVENT_MODIFIED)
 
-    def on_modified(self, view):
-        stack = stack_view(view)
-        stack.save_reset()
-        stack.save()
+    def on_modified_async(self):
+        stack_view(self.view).process_events()
 
 
 class SmartCursorCommand(sublime_plugin.TextCommand):
 
     def run(self, edit, cmd="", **kwargs):
-        stack = stack_view(self.view)
-        new_sel = stack.get_new_sel(kwargs.get('forward'))
-        if new_sel:
-            self.view.sel().clear()
-            for sel in new_sel:
-                self.view.sel().add(sel)
+        if not self.view.settings().get('is_widget'):
+            stack = stack_view(self.view)
+            # A fast keypress can get here before the async hooks have caught
+            # up with the edits and caret moves before it.
+            stack.process_events()
+            new_sel = stack.get_new_sel(kwargs.get('forward'))
+            if new_sel:
+                self.view.sel().clear()
+                for sel in new_sel:
+                    self.view.sel().add(sel)
         self.view.run_command(cmd, kwargs)
 
 
@@ -1,11 +1,214 @@
+import codecs
+import os
+import re
+import threading
+import time
+
 import sublime
 import sublime_plugin
 
-_COLOR_STRINGS = ('<b><color=#b0cdac>', '</color></b>')
+if __package__:
+    from .view_appender import ViewAppender
+else:
+    from view_appender import ViewAppender
+
+# Every Unity rich text tag: <b>, <i>, <size=..>, <color=..>, <material=..>,
+# their closing tags, and <quad ..>.
+_RICH_TEXT_TAG = re.compile(r'</?(?:b|i|size|color|material)(?:=[^<>\n]*)?>|<quad(?:\s[^<>\n]*)?>')
+# Longest tag worth holding back at the end of a chunk in case it was cut
+# in two.
+_MAX_TAG_LENGTH = 256
+_CHUNK_SIZE = 1024 * 1024
+
+# How often a tailed log is checked for new data, and how long appends to
+# its view are batched up for (at most _CHUNK_SIZE characters at a time).
+_TAIL_POLL_INTERVAL = 0.5
+_TAIL_FLUSH_INTERVAL = 100
+# Characters a tail view is trimmed back to from the start, which is also
+# about how much of the existing log it starts with.
+_TAIL_VIEW_LIMIT = 4 * 1024 * 1024
+
+# view id -> UnityLogTail
+_tails = {}
+
+
+def strip_rich_text(text):
+    return _RICH_TEXT_TAG.sub('', text)
+
+
+class RichTextStripper:
+    """Strips text fed to it in pieces, holding back a tag cut off at the
+    end of a piece until the rest of it arrives."""
+
+    def __init__(self):
+        self.carry = ''
+
+    def feed(self, text):
+        text = self.carry + text
+        # Tags never span lines, so only text after the last newline is
+        # ever held back.
+        cut = text.rfind('<', max(0, len(text) - _MAX_TAG_LENGTH))
+        if cut != -1 and text.find('>', cut) == -1 and text.find('\n', cut) == -1:
+            self.carry = text[cut:]
+            text = text[:cut]
+        else:
+            self.carry = ''
+        return strip_rich_text(text)
+
+    def flush(self):
+        text, self.carry = self.carry, ''
+        return strip_rich_text(text)
+
+
+def strip_rich_text_stream(src, dst, chunk_size=_CHUNK_SIZE):
+    stripper = RichTextStripper()
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            break
+        dst.write(stripper.feed(chunk))
+    dst.write(stripper.flush())
+
+
+def default_editor_log_path():
+    if sublime.platform() == 'windows':
+        return os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Unity', 'Editor', 'Editor.log')
+    elif sublime.platform() == 'osx':
+        return os.path.expanduser('~/Library/Logs/Unity/Editor.log')
+    return os.path.expanduser('~/.config/unity3d/Editor.log')
+
 
 class StripColorFromUnityLogCommand(sublime_plugin.TextCommand):
     def run(self, edit):
-        for string in _COLOR_STRINGS:
-            regions = self.view.find_all(string, sublime.LITERAL)
-            for region in reversed(regions):
-                self.view.erase(edit, region)
+        region = sublime.Region(0, self.view.size())
+        text = self.view.substr(region)
+        stripped = strip_rich_text(text)
+        if stripped != text:
+            self.view.replace(edit, region, stripped)
+
+
+class StripColorFromUnityLogFileCommand(sublime_plugin.WindowCommand):
+    """Strips a log on disk into output_path (by default alongside it, as
+    <name>.stripped<ext>) a chunk at a time, then opens the result."""
+
+    def run(self, file_path=None, output_path=None):
+        if not file_path:
+            self.window.show_input_panel(
+                'Unity log:', default_editor_log_path(),
+                lambda file_path: self.run(file_path, output_path), None, None)
+            return
+
+        file_path = os.path.expanduser(file_path)
+        if not output_path:
+            root, ext = os.path.splitext(file_path)
+            output_path = f'{root}.stripped{ext}'
+        threading.Thread(target=self.strip_file, args=(file_path, output_path), daemon=True).start()
+
+    def strip_file(self, file_path, output_path):
+        sublime.status_message(f'Stripping {file_path}...')
+        try:
+            # surrogateescape and newline='' pass anything that isn't a tag
+            # through byte for byte.
+            with open(file_path, encoding='utf-8', errors='surrogateescape', newline='') as src, \
+                    open(output_path, 'w', encoding='utf-8', errors='surrogateescape', newline='') as dst:
+                strip_rich_text_stream(src, dst)
+        except OSError as ex:
+            sublime.set_timeout(lambda: sublime.error_message(f'Could not strip {file_path}: {ex}'))
+            return
+        sublime.set_timeout(lambda: self.window.open_file(output_path))
+
+
+class UnityLogTail(ViewAppender):
+    """Follows a log file from a background thread, appending what's added
+    to it, stripped, to a read-only view in batches from the UI thread.
+    """
+
+    def __init__(self, view, file_path):
+        # Anything waiting beyond a view's worth would only be trimmed again.
+        super().__init__(_CHUNK_SIZE, _TAIL_VIEW_LIMIT, _TAIL_VIEW_LIMIT, _TAIL_FLUSH_INTERVAL)
+        self.view = view
+        self.file_path = file_path
+        self.file_id = None
+        self.offset = None
+        self.stripper = RichTextStripper()
+        self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+        self.running = True
+        threading.Thread(target=self._run, name=f'tail {file_path}', daemon=True).start()
+
+    def stop(self):
+        self.running = False
+
+    def _run(self):
+        while self.running:
+            try:
+                self.poll()
+            except OSError:
+                # Gone while Unity restarts, pick it up again when it's back.
+                pass
+            time.sleep(_TAIL_POLL_INTERVAL)
+
+    def poll(self):
+        stat = os.stat(self.file_path)
+        file_id = (stat.st_dev, stat.st_ino)
+        skip_partial_line = False
+        if self.offset is None:
+            # Start with about a view's worth of the end of the log.
+            self.offset = max(0, stat.st_size - _TAIL_VIEW_LIMIT)
+            skip_partial_line = self.offset > 0
+        elif file_id != self.file_id or stat.st_size < self.offset:
+            # Unity starts a new log (or truncates the old one) when it
+            # restarts.
+            self.offset = 0
+            self.stripper = RichTextStripper()
+            self.decoder.reset()
+            self.write(f'\n--- {self.file_path} restarted ---\n')
+        self.file_id = file_id
+        if stat.st_size == self.offset:
+            return
+
+        with open(self.file_path, 'rb') as fp:
+            fp.seek(self.offset)
+            if skip_partial_line:
+                fp.readline()
+            while self.running:
+                data = fp.read(_CHUNK_SIZE)
+                if not data:
+                    break
+                self.write(self.stripper.feed(self.decoder.decode(data)))
+            self.offset = fp.tell()
+
+    def get_view(self):
+        if not self.view.is_valid():
+            self.stop()
+            return None
+        return self.view
+
+
+class TailUnityLogCommand(sublime_plugin.WindowCommand):
+    """Follows a Unity log (Editor.log by default) in a read-only view,
+    stripped of rich text tags, until the view is closed."""
+
+    def run(self, file_path=None):
+        file_path = os.path.expanduser(file_path or default_editor_log_path())
+        for tail in _tails.values():
+            if tail.file_path == file_path and tail.view.window() == self.window:
+                return self.window.focus_view(tail.view)
+
+        view = self.window.new_file()
+        view.set_name(f'{os.path.basename(file_path)} (tail)')
+        view.set_scratch(True)
+        view.set_read_only(True)
+        _tails[view.id()] = UnityLogTail(view, file_path)
+
+
+class UnityLogTailListener(sublime_plugin.EventListener):
+    def on_close(self, view):
+        tail = _tails.pop(view.id(), None)
+        if tail:
+            tail.stop()
+
+
+def plugin_unloaded():
+    for tail in _tails.values():
+        tail.stop()
+    _tails.clear()
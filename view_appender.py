@@ -0,0 +1,97 @@
+import collections
+import threading
+
+import sublime
+import sublime_plugin
+
+
+class ViewAppender:
+    """Collects text from any thread and appends it to a view from the UI
+    thread, in batches of at most batch_size characters every
+    flush_interval ms, so a flood of text can't monopolize the UI thread.
+
+    Text waiting beyond pending_limit characters is dropped, oldest first,
+    and whole lines are trimmed off the start of the view beyond view_limit
+    characters.  Subclasses say which view to append to with get_view(),
+    and can report dropped text with format_dropped().
+    """
+
+    def __init__(self, batch_size, pending_limit, view_limit, flush_interval):
+        self.batch_size = batch_size
+        self.pending_limit = pending_limit
+        self.view_limit = view_limit
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        # (label, text), no longer than batch_size each
+        self.pending = collections.deque()
+        self.pending_size = 0
+        self.dropped = 0
+        self.flush_scheduled = False
+        self.last_label = None
+
+    def get_view(self):
+        """Returns the view to append to, or None to throw the text away."""
+        raise NotImplementedError
+
+    def format_dropped(self, count):
+        return ''
+
+    def write(self, text, label=None):
+        """Queues text to be appended.  Text is headed by its label
+        whenever that's different from the text before it."""
+        with self.lock:
+            # Queued in batch sized pieces, so one long write can be flushed
+            # (or dropped) a piece at a time.
+            for start in range(0, len(text), self.batch_size):
+                self.pending.append((label, text[start:start + self.batch_size]))
+            self.pending_size += len(text)
+            while self.pending_size > self.pending_limit and len(self.pending) > 1:
+                _, dropped_text = self.pending.popleft()
+                self.pending_size -= len(dropped_text)
+                self.dropped += len(dropped_text)
+            if not self.flush_scheduled and self.pending:
+                self.flush_scheduled = True
+                sublime.set_timeout(self.flush, self.flush_interval)
+
+    def flush(self):
+        parts = []
+        with self.lock:
+            if self.dropped:
+                parts.append(self.format_dropped(self.dropped))
+                self.dropped = 0
+            size = 0
+            while self.pending:
+                label, text = self.pending[0]
+                if size and size + len(text) > self.batch_size:
+                    break
+                self.pending.popleft()
+                self.pending_size -= len(text)
+                size += len(text)
+                if label is not None and label != self.last_label:
+                    parts.append(f'--- {label} ---\n')
+                    self.last_label = label
+                parts.append(text)
+            self.flush_scheduled = bool(self.pending)
+            if self.flush_scheduled:
+                sublime.set_timeout(self.flush, self.flush_interval)
+
+        text = ''.join(parts)
+        if not text:
+            return
+        view = self.get_view()
+        if view is None:
+            return
+        view.run_command('append', {'characters': text, 'force': True, 'scroll_to_end': True})
+        excess = view.size() - self.view_limit
+        if excess > 0:
+            view.run_command('trim_view_start', {'size': excess})
+
+
+class TrimViewStartCommand(sublime_plugin.TextCommand):
+    def run(self, edit, size):
+        # Trim whole lines so the view never starts mid-line.
+        end = self.view.full_line(size).end()
+        read_only = self.view.is_read_only()
+        self.view.set_read_only(False)
+        self.view.erase(edit, sublime.Region(0, end))
+        self.view.set_read_only(read_only)